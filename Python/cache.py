@@ -0,0 +1,102 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+import numpy
+
+import storage
+from config import config
+
+def digest(h, value):
+    if isinstance(value, numpy.ndarray):
+        h.update('%s%s' % (value.dtype.str, value.shape))
+        h.update(numpy.ascontiguousarray(value).tostring())
+    elif isinstance(value, (list, tuple)):
+        h.update('[%d' % len(value))
+        for item in value:
+            digest(h, item)
+    else:
+        h.update(json.dumps(value, sort_keys=True))
+
+def fingerprint(*parts):
+    h = hashlib.sha1()
+    for part in parts:
+        digest(h, part)
+    return h.hexdigest()
+
+def instance_fingerprint(instance, blocksize=1024):
+    h = hashlib.sha1()
+    digest(h, storage.instance_to_json(instance))
+    if not (instance._timematrix is None or instance._distmatrix is None):
+        n = len(instance._index)
+        digest(h, n)
+        for lookup in (instance.time_many, instance.dist_many):
+            for lo in xrange(0, n, blocksize):
+                rows = numpy.arange(lo, min(lo + blocksize, n))
+                h.update(lookup(rows[:,None], numpy.arange(n)[None,:]).tostring())
+    return h.hexdigest()
+
+def location_fingerprint(origins, destinations):
+    return fingerprint('matrices', config['osrm'].get('osm', ''), [(p.lon, p.lat) for p in origins], [(p.lon, p.lat) for p in destinations])
+
+class Cache(object):
+
+    def __init__(self, directory=None, maxsize=None):
+        settings = config.get('cache', {})
+        self.directory = directory if directory else settings.get('path', config['data']['base'] + 'cache/')
+        self.maxsize = maxsize if maxsize else settings.get('size', 8 * 2**30)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def entry(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key, name):
+        filename = os.path.join(self.entry(key), name)
+        if not os.path.isfile(filename):
+            return None
+        os.utime(self.entry(key), None)
+        return filename
+
+    def put(self, key, name, write):
+        directory = tempfile.mkdtemp(prefix='tmp', dir=self.directory)
+        try:
+            write(os.path.join(directory, name))
+            if not os.path.isdir(self.entry(key)):
+                os.makedirs(self.entry(key))
+            filename = os.path.join(self.entry(key), name)
+            if os.path.isfile(filename):
+                os.remove(filename)
+            os.rename(os.path.join(directory, name), filename)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        self.evict(keep=key)
+        return filename
+
+    def entries(self):
+        entries = []
+        for key in os.listdir(self.directory):
+            if key.startswith('tmp') or not os.path.isdir(self.entry(key)):
+                continue
+            size = sum(os.path.getsize(os.path.join(self.entry(key), name)) for name in os.listdir(self.entry(key)))
+            entries.append((os.path.getmtime(self.entry(key)), size, key))
+        return sorted(entries)
+
+    def evict(self, keep=None):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.maxsize:
+                break
+            if key == keep:
+                continue
+            directory = tempfile.mkdtemp(prefix='tmp', dir=self.directory)
+            try:
+                os.rename(self.entry(key), os.path.join(directory, key))
+            except OSError:
+                continue
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+            total -= size
@@ -0,0 +1,143 @@
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from collections import deque
+from cStringIO import StringIO
+import os
+import gzip
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+extensions = {'.gz': 'gzip', '.zst': 'zstd', '.lz4': 'lz4'}
+suffixes = {'gzip': '.gz', 'pgzip': '.gz', 'zstd': '.zst', 'lz4': '.lz4'}
+
+def codec(filename, compress=None):
+    extension = os.path.splitext(filename)[1]
+    if compress is None:
+        return filename, extensions.get(extension, False)
+    if not compress:
+        return filename, False
+    name = 'gzip' if compress is True else compress
+    if not name in suffixes:
+        raise ValueError('Unknown codec %s' % name)
+    return filename if extension == suffixes[name] else filename + suffixes[name], name
+
+def open_file(filename, mode='r', compress=None, parallel=False):
+    filename, name = codec(filename, compress)
+    if not name:
+        return open(filename, mode)
+    if name == 'pgzip' or (name == 'gzip' and parallel):
+        return ParallelGzipFile(filename) if 'w' in mode else gzip.open(filename, 'rb')
+    if name == 'gzip':
+        return gzip.open(filename, 'wb' if 'w' in mode else 'rb')
+    if name == 'zstd':
+        return ZstdFile(filename, mode)
+    if lz4 is None:
+        raise ImportError('lz4 is required for %s' % filename)
+    return lz4.frame.open(filename, 'wb' if 'w' in mode else 'rb')
+
+def gzip_member(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+class ParallelGzipFile(object):
+
+    def __init__(self, filename, level=6, blocksize=1<<22, threads=None):
+        self.fileobj = open(filename, 'wb')
+        self.level = level
+        self.blocksize = blocksize
+        self.threads = threads if threads else cpu_count()
+        self.pool = ThreadPool(self.threads)
+        self.pending = deque()
+        self.buffer = []
+        self.size = 0
+        self.empty = True
+
+    def write(self, data):
+        self.buffer.append(data)
+        self.size += len(data)
+        if self.size >= self.blocksize:
+            self.submit()
+
+    def submit(self):
+        if self.buffer:
+            self.pending.append(self.pool.apply_async(gzip_member, (''.join(self.buffer), self.level)))
+            self.buffer = []
+            self.size = 0
+            self.empty = False
+        while len(self.pending) > 2 * self.threads:
+            self.fileobj.write(self.pending.popleft().get())
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.fileobj.closed:
+            return
+        try:
+            self.submit()
+            while self.pending:
+                self.fileobj.write(self.pending.popleft().get())
+            if self.empty:
+                self.fileobj.write(gzip_member('', self.level))
+        finally:
+            self.pool.terminate()
+            self.pool.join()
+            self.fileobj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class ZstdFile(object):
+
+    def __init__(self, filename, mode='r', level=3):
+        if zstandard is None:
+            raise ImportError('zstandard is required for %s' % filename)
+        self.writing = 'w' in mode
+        self.fileobj = open(filename, 'wb' if self.writing else 'rb')
+        if self.writing:
+            self.compressor = zstandard.ZstdCompressor(level=level, threads=-1).compressobj()
+        else:
+            decompressor = zstandard.ZstdDecompressor().decompressobj()
+            self.buffer = StringIO()
+            for chunk in iter(lambda: self.fileobj.read(1<<20), ''):
+                self.buffer.write(decompressor.decompress(chunk))
+            self.buffer.seek(0)
+
+    def write(self, data):
+        self.fileobj.write(self.compressor.compress(data))
+
+    def read(self, size=-1):
+        return self.buffer.read(size)
+
+    def __iter__(self):
+        return iter(self.buffer)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.fileobj.closed:
+            return
+        try:
+            if self.writing:
+                self.fileobj.write(self.compressor.flush())
+        finally:
+            self.fileobj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -2,9 +2,13 @@ from argparse import ArgumentParser
 from datetime import timedelta
 import random
 from os import path
+import shutil
+
+import numpy
 
 import storage
 import taskgraph
+import cache
 import osrm
 import util
 from config import config
@@ -17,7 +21,16 @@ if __name__ == '__main__':
     parser.add_argument('-l', type=int, nargs='*', dest='splitlength')
     parser.add_argument('-o', type=str, dest='fileoutput')
     parser.add_argument('-r', type=int, dest='restriction')
+    parser.add_argument('-w', type=int, dest='horizon')
+    parser.add_argument('-p', type=int, dest='processes')
+    parser.add_argument('-i', type=int, dest='maxidle')
+    parser.add_argument('-k', type=int, dest='successors')
+    parser.add_argument('-c', type=float, dest='maxcost')
     parser.add_argument('--compress', action='store_true')
+    parser.add_argument('--compact', action='store_true')
+    parser.add_argument('--binary', action='store_true')
+    parser.add_argument('--nocache', action='store_true')
+    parser.add_argument('--index', action='store_true')
     parser.add_argument('--customer', action='store_true')
     parser.add_argument('--time', action='store_true')
     parser.add_argument('--statistics', action='store_true')
@@ -26,6 +39,7 @@ if __name__ == '__main__':
     
     printer = util.Printer(statistics = args.statistics, verbose = args.verbose)
     compress = '' if args.compress else '.gz'
+    store = None if args.nocache else cache.Cache()
 
     printer.write('Process started')
     
@@ -36,11 +50,11 @@ if __name__ == '__main__':
     instancefile = config['data']['base'] + instancename
     if path.isfile(instancefile + '.json.gz'):
         instancefile += '.json.gz'
-        instance = storage.load_instance_from_json(instancefile)
+        instance = storage.load_instance_from_json(instancefile, dtype=numpy.int32 if args.compact else float)
         printer.writeInfo('Instance successfully loaded from %s' % instancefile)
     if path.isfile(instancefile + '.json'):
         instancefile += '.json'
-        instance = storage.load_instance_from_json(instancefile)
+        instance = storage.load_instance_from_json(instancefile, dtype=numpy.int32 if args.compact else float)
         printer.writeInfo('Instance successfully loaded from %s' % instancefile)
     assert not instance is None
     
@@ -62,13 +76,22 @@ if __name__ == '__main__':
         if subsets:
             instance = instance.subinstance(**subsets)
     
-    if instance._time is None or instance._dist is None:
+    if instance._timematrix is None or instance._distmatrix is None:
         export = True
-        extendedvertices = instance.extendedvertices
-        printer.writeInfo('Getting %d x %d matrix ...' %(len(extendedvertices), len(extendedvertices)))
-        with osrm.osrm_parallel() as router:
-            instance._time, instance._dist = router.matrix(extendedvertices, extendedvertices)
-        printer.writeInfo('Matrix successfully loaded')
+        origins, destinations, rows, cols = instance.locations()
+        matrixkey = cache.location_fingerprint(origins, destinations)
+        if store and store.get(matrixkey, 'time.npy') and store.get(matrixkey, 'dist.npy'):
+            time, dist = numpy.load(store.get(matrixkey, 'time.npy')), numpy.load(store.get(matrixkey, 'dist.npy'))
+            printer.writeInfo('Matrix successfully loaded from cache')
+        else:
+            printer.writeInfo('Getting %d x %d matrix ...' %(len(origins), len(destinations)))
+            with osrm.osrm_parallel() as router:
+                time, dist = router.matrix(origins, destinations)
+            if store:
+                store.put(matrixkey, 'time.npy', lambda filename: numpy.save(filename, time))
+                store.put(matrixkey, 'dist.npy', lambda filename: numpy.save(filename, dist))
+            printer.writeInfo('Matrix successfully loaded')
+        instance.set_matrices(time, dist, rows, cols)
 
     printer.writeStat('Name: %s' % instance._basename)
     printer.writeStat('Vehicles: %d, Customers: %d, Routes: %d, Trips: %d, Refuelpoints: %d' % (len(instance.vehicles), len(instance._customers), len(instance._routes), len(instance._trips), len(instance._refuelpoints)))
@@ -77,13 +100,32 @@ if __name__ == '__main__':
     if export:
         instancefile = config['data']['base'] + instancename + '.json%s' % compress
         printer.writeInfo('Saving instance ...')
-        storage.save_instance_to_json(instancefile, instance)
+        storage.save_instance_to_json(instancefile, instance, binary=args.binary)
         printer.writeInfo('Instance successfully saved to %s' % instancefile)
+        if args.index:
+            storage.save_instance_to_index(instancefile, instance)
+            printer.writeInfo('Instance index successfully saved')
+    
+    graphkey = cache.fingerprint('taskgraph', cache.instance_fingerprint(instance), args.horizon, args.maxidle, args.successors, args.maxcost) if store else None
     
     graph = None
-    if not export:
+    cached = False
+    if store and store.get(graphkey, 'graph.bin'):
+        printer.writeInfo('Loading task graph ...')
+        graphfile = config['data']['base'] + instancename + '.graph.bin'
+        shutil.copyfile(store.get(graphkey, 'graph.bin'), graphfile)
+        graph = taskgraph.load_taskgraph_from_binary(graphfile, instance.dictionary)
+        printer.writeInfo('Task graph successfully loaded from cache')
+        export = True
+        cached = True
+    if graph is None and not export:
         graphfile = config['data']['base'] + instancename + '.graph'
-        if path.isfile(graphfile + '.json.gz'):
+        if path.isfile(graphfile + '.bin'):
+            printer.writeInfo('Loading task graph ...')
+            graphfile += '.bin'
+            graph = taskgraph.load_taskgraph_from_binary(graphfile, instance.dictionary)
+            printer.writeInfo('Task graph successfully loaded from %s' % graphfile)
+        elif path.isfile(graphfile + '.json.gz'):
             printer.writeInfo('Loading task graph ...')
             graphfile += '.json.gz'
             graph = taskgraph.load_taskgraph_from_json(graphfile, instance.dictionary)
@@ -96,19 +138,32 @@ if __name__ == '__main__':
     if graph is None:
         export = True
         printer.writeInfo('Creating task graph ...')
-        graph = taskgraph.create_taskgraph(instance)
+        graph = taskgraph.create_taskgraph(instance, horizon=timedelta(minutes=args.horizon) if args.horizon else None, processes=args.processes)
         printer.writeInfo('Task graph successfully created')
+        if not (args.maxidle is None and args.successors is None and args.maxcost is None):
+            printer.writeInfo('Sparsifying task graph ...')
+            graph, removed = taskgraph.sparsify_taskgraph(instance, graph, maxidle=timedelta(minutes=args.maxidle) if not args.maxidle is None else None, successors=args.successors, maxcost=args.maxcost)
+            printer.writeStat('Removed Edges: %s' % ', '.join('%s: %d' % item for item in removed.iteritems()))
+            printer.writeInfo('Task graph successfully sparsified')
+        if store:
+            store.put(graphkey, 'graph.bin', lambda filename: taskgraph.save_taskgraph_to_binary(graph, filename))
 
-    printer.writeStat('Nodes: %d, Edges: %d' % (len(graph.nodes()), len(graph.edges())))
+    printer.writeStat('Nodes: %d, Edges: %d' % (graph.number_of_nodes(), graph.number_of_edges()))
         
     if export:
         xpressfile = config['data']['base'] + instancename + '.txt%s' % compress
         printer.writeInfo('Exporting task graph ...')
-        taskgraph.save_taskgraph_to_xpress(xpressfile, instance, graph)
+        if store and store.get(graphkey, 'graph.txt%s' % compress):
+            shutil.copyfile(store.get(graphkey, 'graph.txt%s' % compress), xpressfile)
+        else:
+            taskgraph.save_taskgraph_to_xpress(xpressfile, instance, graph)
+            if store:
+                store.put(graphkey, 'graph.txt%s' % compress, lambda filename: shutil.copyfile(xpressfile, filename))
         printer.writeInfo('Task graph successfully exported to %s' % xpressfile)
-        graphfile = config['data']['base'] + instancename + '.graph.json%s' % compress
-        printer.writeInfo('Saving task graph ...')
-        taskgraph.save_taskgraph_to_json(graph, graphfile)
+        graphfile = config['data']['base'] + instancename + '.graph.bin'
+        if not cached:
+            printer.writeInfo('Saving task graph ...')
+            taskgraph.save_taskgraph_to_binary(graph, graphfile)
         printer.writeInfo('Task graph successfully saved to %s' % graphfile)
 
     startsplit = instance.starttime
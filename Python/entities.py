@@ -1,8 +1,10 @@
 import xpress
+import util
 from distance_matrix import DistanceMatrix
 
 import math
 from datetime import datetime
+from itertools import izip
 import logging
 logging.getLogger('fastkml.config').addHandler(logging.NullHandler())
 import fastkml
@@ -103,12 +105,12 @@ class Trip:
         return self.finish_time - self.start_time
     
     @staticmethod
-    def parse(trip):
+    def parse(trip, start_time=None, finish_time=None):
         return Trip(
             location_id = trip['location_id'],
             vehicle_vin = trip['vehicle_vin'],
-            start_time = datetime.strptime(trip['start_time'], '%Y-%m-%d %H:%M:%S'),
-            finish_time = datetime.strptime(trip['finish_time'], '%Y-%m-%d %H:%M:%S'),
+            start_time = start_time if start_time else datetime.strptime(trip['start_time'], '%Y-%m-%d %H:%M:%S'),
+            finish_time = finish_time if finish_time else datetime.strptime(trip['finish_time'], '%Y-%m-%d %H:%M:%S'),
             distance = trip['distance'],
             servicedrive = trip['servicedrive'],
             start_longitude = trip['start_longitude'],
@@ -117,6 +119,11 @@ class Trip:
             finish_latitude = trip['finish_latitude']
         )
     
+    @staticmethod
+    def parse_many(trips):
+        trips = list(trips)
+        return [Trip.parse(trip, start_time, finish_time) for trip, start_time, finish_time in izip(trips, util.parse_times(trip['start_time'] for trip in trips), util.parse_times(trip['finish_time'] for trip in trips))]
+    
     def __json__(self):
         return {
             'location_id': self.location_id,
@@ -174,15 +181,20 @@ class Vehicle:
         return self.start_time
     
     @staticmethod
-    def parse(vehicle):
+    def parse(vehicle, start_time=None):
         return Vehicle(
             vehicle_id = vehicle['id'],
-            start_time = datetime.strptime(vehicle['start_time'], '%Y-%m-%d %H:%M:%S'),
+            start_time = start_time if start_time else datetime.strptime(vehicle['start_time'], '%Y-%m-%d %H:%M:%S'),
             longitude = vehicle['longitude'],
             latitude = vehicle['latitude'],
             fuel = vehicle['fuel']
         )
     
+    @staticmethod
+    def parse_many(vehicles):
+        vehicles = list(vehicles)
+        return [Vehicle.parse(vehicle, start_time) for vehicle, start_time in izip(vehicles, util.parse_times(vehicle['start_time'] for vehicle in vehicles))]
+    
     def __json__(self):
         return {
             'id': self.id,
@@ -6,8 +6,15 @@ import numpy
 import itertools
 
 import entities
+import util
+from pareto import ParetoSets
 
-class Instance:
+def column(iterable, dtype=float):
+    array = numpy.array(list(iterable), dtype=dtype)
+    array.flags.writeable = False
+    return array
+
+class Instance(object):
     _basename = ''
 
     _fuelpermeter = 0
@@ -22,11 +29,35 @@ class Instance:
     _trips = []
     _refuelpoints = []
     _index = {}
+    _vertices = ()
+    _extendedvertices = ()
+    _vertexindices = None
+
+    _start_time = None
+    _finish_time = None
+    _start_loc = None
+    _finish_loc = None
+    _distance = None
+
+    _customerwindows = {}
+    _customerpositions = None
+    _earliest = None
+    _latest = None
 
-    _time = None
-    _dist = None
-    _paretorefuelpoints = None
+    _timematrix = None
+    _distmatrix = None
+    _rows = None
+    _cols = None
+    _timecache = None
+    _distcache = None
+    _pareto = None
+    _paretosets = None
     _initialfuel = None
+    _refuelpointindex = None
+    _customerindex = None
+    _dictionary = None
+    _starttime = None
+    _finishtime = None
 
     def __init__(self, vehicles, customers, routes, routecost, refuelpoints, fuelpermeter, refuelpersecond, costpermeter, costpercar):
 
@@ -59,6 +90,25 @@ class Instance:
         self._index = {s: i for i, s in enumerate(chain(sorted(self.vehicles, key = lambda k: k.id), sorted(self.trips, key = lambda k: k.vehicle_vin), sorted(self.refuelpoints, key = lambda k: k.id)))}
         
         self._initialfuel = numpy.ones((len(vehicles),), dtype=float)
+        
+        self._vertices = tuple(chain(self._vehicles, self._trips))
+        self._extendedvertices = self._vertices + tuple(self._refuelpoints)
+        self._vertexindices = column((self._index[s] for s in self._vertices), numpy.int64)
+        
+        ordered = sorted(self._vertices, key=self._index.get)
+        self._start_time = column(util.to_seconds(s.start_time) for s in ordered)
+        self._finish_time = column(util.to_seconds(s.finish_time) for s in ordered)
+        self._start_loc = column(((s.start_loc.lon, s.start_loc.lat) for s in ordered)).reshape(-1, 2)
+        self._finish_loc = column(((s.finish_loc.lon, s.finish_loc.lat) for s in ordered)).reshape(-1, 2)
+        self._distance = column(s.distance if isinstance(s, entities.Trip) else 0.0 for s in ordered)
+        self._routetable.flags.writeable = False
+        self._customertable.flags.writeable = False
+        
+        self._customerwindows = OrderedDict((c, (min(t.start_time for t in trips), max(t.start_time for t in trips))) for (c, trips) in self._customertrips.iteritems())
+        position = dict((c, i) for i, c in enumerate(self._customers.iterkeys()))
+        self._customerpositions = column((position.get(c, -1) for c in self._customertable), numpy.int64)
+        self._earliest = column(util.to_seconds(earliest) for (earliest, _) in self._customerwindows.itervalues())
+        self._latest = column(util.to_seconds(latest) for (_, latest) in self._customerwindows.itervalues())
     
     @property
     def vehicles(self):
@@ -74,11 +124,11 @@ class Instance:
     
     @property
     def vertices(self):
-        return self.vehicles + self.trips
+        return list(self._vertices)
     
     @property
     def extendedvertices(self):
-        return self.vehicles + self.trips + self.refuelpoints
+        return list(self._extendedvertices)
     
     @property
     def maxrange(self):
@@ -86,15 +136,21 @@ class Instance:
     
     @property
     def starttime(self):
-        return min(map((lambda t: t.start_time), self._trips))
+        if self._starttime is None:
+            self._starttime = min(map((lambda t: t.start_time), self._trips))
+        return self._starttime
     
     @property
     def finishtime(self):
-        return max(map((lambda t: t.finish_time), self._trips))
+        if self._finishtime is None:
+            self._finishtime = max(map((lambda t: t.finish_time), self._trips))
+        return self._finishtime
     
     @property
     def dictionary(self):
-        return entities.get_dict(self.extendedvertices)
+        if self._dictionary is None:
+            self._dictionary = entities.get_dict(self._extendedvertices)
+        return self._dictionary
     
     @property
     def customers(self):
@@ -107,39 +163,173 @@ class Instance:
         return self._routetable[self._index[t]];
     
     def customer_starttime(self, t):
-        return min(map((lambda t: t.start_time), self._customertrips.get(self.customer(t))))
+        return self._customerwindows[self.customer(t)][0]
     
     def earliest_starttime(self, c):
-        return min(map(lambda k: k.start_time, self._customertrips.get(c)))
+        return self._customerwindows[c][0]
     
     def latest_starttime(self, c):
-        return max(map(lambda k: k.start_time, self._customertrips.get(c)))
+        return self._customerwindows[c][1]
+    
+    def customer_index(self):
+        if self._customerindex is None:
+            order = numpy.argsort(self._earliest, kind='mergesort')
+            maxwindow = numpy.max(self._latest - self._earliest) if len(order) else 0.0
+            self._customerindex = self._customerwindows.keys(), order, self._earliest[order], maxwindow
+        return self._customerindex
+    
+    def customers_between(self, a, b):
+        customers, order, earliest, maxwindow = self.customer_index()
+        a, b = util.to_seconds(a), util.to_seconds(b)
+        candidates = order[numpy.searchsorted(earliest, a - maxwindow):numpy.searchsorted(earliest, b, side='right')]
+        return [customers[i] for i in candidates[self._latest[candidates] >= a]]
     
     def time(self, s, t):
-        return self._time[self._index[s], self._index[t]]
+        return self.time_many(self._index[s], self._index[t])
 
     def timedelta(self, s=None, t=None):
-        return timedelta(seconds = int(self._time[self._index[s], self._index[t]]))
+        return timedelta(seconds = int(self.time_many(self._index[s], self._index[t])))
 
     def dist(self, s, t):
         if isinstance(s, list) and isinstance(t, list):
-            return [[self._dist[self._index[tmp_s], self._index[tmp_t]] for tmp_t in t] for tmp_s in s]
-        return self._dist[self._index[s], self._index[t]]
+            return self.dist_many(self.ids(s)[:,None], self.ids(t)[None,:]).tolist()
+        return self.dist_many(self._index[s], self._index[t])
 
     def fuel(self, s, t=None):
-        return self._fuelpermeter * (self._dist[self._index[s], self._index[t]] if t else 0.0 if self._index[s] < len(self._vehicles) else s.distance)
+        return self._fuelpermeter * (self.dist_many(self._index[s], self._index[t]) if t else 0.0 if self._index[s] < len(self._vehicles) else s.distance)
 
     def cost(self, s, t=None):
-        try:
-            index = self._index[s]
-        except(KeyError):
-            print s
-        
-        return (self._costpercar if self._index[s] < len(self._vehicles) else 0) + self._costpermeter * self._dist[self._index[s], self._index[t]] if t else 0.0 if self._index[s] < len(self._vehicles) else self._costpermeter * s.distance
+        index = self._index[s]
+        return (self._costpercar if index < len(self._vehicles) else 0) + self._costpermeter * self.dist_many(index, self._index[t]) if t else 0.0 if index < len(self._vehicles) else self._costpermeter * s.distance
+
+    def ids(self, vertices):
+        return numpy.fromiter((self._index[s] for s in vertices), dtype=numpy.int64)
+
+    def mapped(self, matrix, src, dst):
+        src = src if self._rows is None else self._rows[src]
+        dst = dst if self._cols is None else self._cols[dst]
+        return matrix[src, dst]
+
+    def lookup(self, matrix, src, dst):
+        return self.mapped(matrix, src, dst).astype(float)
+
+    def time_many(self, src, dst):
+        return self.lookup(self._timematrix, src, dst)
+
+    def dist_many(self, src, dst):
+        return self.lookup(self._distmatrix, src, dst)
+
+    def fuel_many(self, src, dst=None):
+        return self._fuelpermeter * (self._distance[src] if dst is None else self.dist_many(src, dst))
+
+    def cost_many(self, src, dst=None):
+        if dst is None:
+            return self._costpermeter * self._distance[src]
+        return numpy.where(numpy.asarray(src) < len(self._vehicles), self._costpercar, 0.0) + self._costpermeter * self.dist_many(src, dst)
+
+    def dense(self, matrix):
+        if matrix is None or (self._rows is None and self._cols is None and matrix.dtype == float):
+            return matrix
+        n = len(self._index)
+        rows = numpy.arange(n) if self._rows is None else self._rows
+        cols = numpy.arange(n) if self._cols is None else self._cols
+        return numpy.asarray(matrix[rows[:,None], cols[None,:]], dtype=float)
+
+    @property
+    def _time(self):
+        if self._timecache is None:
+            self._timecache = self.dense(self._timematrix)
+        return self._timecache
+
+    @_time.setter
+    def _time(self, matrix):
+        if not (self._rows is None and self._cols is None):
+            self.materialize()
+        self._timematrix = matrix
+        self._timecache = None
+
+    @property
+    def _dist(self):
+        if self._distcache is None:
+            self._distcache = self.dense(self._distmatrix)
+        return self._distcache
+
+    @_dist.setter
+    def _dist(self, matrix):
+        if not (self._rows is None and self._cols is None):
+            self.materialize()
+        self._distmatrix = matrix
+        self._distcache = None
+        self._refuelpointindex = None
+
+    @property
+    def _paretorefuelpoints(self):
+        if self._pareto is None and not self._paretosets is None:
+            self._pareto = self._paretosets.lists()
+        return self._pareto
+
+    @_paretorefuelpoints.setter
+    def _paretorefuelpoints(self, pareto):
+        if pareto is None or isinstance(pareto, ParetoSets):
+            self._paretosets = pareto
+            self._pareto = None
+        else:
+            self._paretosets = ParetoSets.from_lists(pareto)
+            self._pareto = pareto
+
+    def locations(self):
+        ordered = sorted(self._index, key=self._index.get)
+        origins = OrderedDict()
+        rows = column((origins.setdefault(s.location if isinstance(s, entities.RefuelPoint) else s.finish_loc, len(origins)) for s in ordered), numpy.int64)
+        destinations = OrderedDict()
+        cols = column((destinations.setdefault(s.location if isinstance(s, entities.RefuelPoint) else s.start_loc, len(destinations)) for s in ordered), numpy.int64)
+        return origins.keys(), destinations.keys(), rows, cols
+
+    def set_matrices(self, time, dist, rows=None, cols=None):
+        self._timematrix = time
+        self._distmatrix = dist
+        self._rows = rows
+        self._cols = cols
+        self._timecache = None
+        self._distcache = None
+        self._refuelpointindex = None
+
+    def deduplicate(self):
+        _, _, rows, cols = self.locations()
+        src = numpy.unique(rows, return_index=True)[1]
+        dst = numpy.unique(cols, return_index=True)[1]
+        self.set_matrices(self.mapped(self._timematrix, src[:,None], dst[None,:]), self.mapped(self._distmatrix, src[:,None], dst[None,:]), rows, cols)
+
+    def compact(self, dtype=numpy.int32):
+        self._timematrix = numpy.trunc(self._timematrix).astype(dtype)
+        self._distmatrix = numpy.rint(self._distmatrix).astype(dtype)
+        self._timecache = None
+        self._distcache = None
+        self._refuelpointindex = None
+
+    def open_matrices(self, timefile, distfile, mmap_mode='r'):
+        self._time = numpy.load(timefile, mmap_mode=mmap_mode)
+        self._dist = numpy.load(distfile, mmap_mode=mmap_mode)
+
+    def materialize(self):
+        self._timematrix, self._distmatrix = self._time, self._dist
+        self._rows = self._cols = None
 
     def route_cost(self, r):
         return self._routecost.get(r)
     
+    def refuelpoint_index(self):
+        if self._refuelpointindex is None:
+            n = len(self._vehicles) + len(self._trips)
+            refuelpoints = self.ids(self._refuelpoints)
+            dist = self.dist_many(numpy.arange(n)[:,None], refuelpoints[None,:])
+            order = numpy.argsort(dist, axis=1, kind='mergesort')
+            reachable = dist[numpy.arange(n)[:,None], order] <= self.maxrange
+            indptr = numpy.zeros(n + 1, dtype=numpy.int64)
+            numpy.cumsum(numpy.sum(reachable, axis=1), out=indptr[1:])
+            self._refuelpointindex = indptr, order[reachable]
+        return self._refuelpointindex
+    
     #def initialfuel(self, s):
     #    return self._initialfuel[self._index[s]]
     
@@ -150,13 +340,66 @@ class Instance:
         refuelpoints = list(self._refuelpoints if refuelpoints is None else refuelpoints)
         routecost = OrderedDict((route, self._routecost.get(route)) for route in routes)
 
-        subinst = Instance(vehicles, customers, routes, routecost, refuelpoints, self._fuelpermeter, self._refuelpersecond, self._costpermeter, self._costpercar)
+        subinst = object.__new__(Instance)
+        subinst._fuelpermeter = self._fuelpermeter
+        subinst._refuelpersecond = self._refuelpersecond
+        subinst._costpermeter = self._costpermeter
+        subinst._costpercar = self._costpercar
         
-        indices = numpy.fromiter((self._index[v] for v in subinst.vertices), dtype=numpy.int)
-        extindices = numpy.fromiter((self._index[v] for v in subinst.extendedvertices), dtype=numpy.int)
-
-        subinst._time = None if self._time is None else self._time[extindices[:,None], extindices[None,:]]
-        subinst._dist = None if self._dist is None else self._dist[extindices[:,None], extindices[None,:]]
-        subinst._paretorefuelpoints = [[list(self._paretorefuelpoints[i][j]) for j in indices] for i in indices] if self._paretorefuelpoints else None
+        subinst._vehicles = vehicles
+        subinst._customers = customers
+        subinst._routes = routes
+        subinst._routecost = routecost
+        
+        routecustomertable, _ = izip(*sorted([(c, r) for (c, rs) in customers.iteritems() for r in rs], key=lambda (c, r): r))
+        subinst._routecustomertable = numpy.array(list(routecustomertable), dtype=numpy.int32)
+        
+        subinst._customertrips = OrderedDict((customer, list(self._customertrips[customer])) for customer in customers)
+        
+        selected = set(trip for trips in routes.itervalues() for trip in trips)
+        subinst._trips = [trip for trip in self._trips if trip in selected]
+        subinst._refuelpoints = refuelpoints
+        
+        objects = vehicles + subinst._trips + refuelpoints
+        ids = self.ids(objects)
+        order = numpy.argsort(ids, kind='mergesort')
+        indices = ids[order]
+        rank = numpy.empty(len(ids), dtype=numpy.int64)
+        rank[order] = numpy.arange(len(ids))
+        subinst._index = dict(izip(objects, rank.tolist()))
+        
+        subinst._initialfuel = numpy.ones((len(vehicles),), dtype=float)
+        
+        subinst._vertices = tuple(chain(vehicles, subinst._trips))
+        subinst._extendedvertices = subinst._vertices + tuple(refuelpoints)
+        
+        vertices = indices[:len(subinst._vertices)]
+        position = dict((c, i) for i, c in enumerate(self._customers.iterkeys()))
+        positions = numpy.array([position[c] for c in customers], dtype=numpy.int64)
+        remap = numpy.full(len(position) + 1, -1, dtype=numpy.int64)
+        remap[positions] = numpy.arange(len(positions))
+        
+        subinst._vertexindices = rank[:len(subinst._vertices)]
+        subinst._start_time = self._start_time[vertices]
+        subinst._finish_time = self._finish_time[vertices]
+        subinst._start_loc = self._start_loc[vertices]
+        subinst._finish_loc = self._finish_loc[vertices]
+        subinst._distance = self._distance[vertices]
+        subinst._routetable = self._routetable[vertices]
+        subinst._customertable = self._customertable[vertices]
+        subinst._customerpositions = remap[self._customerpositions[vertices]]
+        subinst._earliest = self._earliest[positions]
+        subinst._latest = self._latest[positions]
+        for array in (subinst._vertexindices, subinst._start_time, subinst._finish_time, subinst._start_loc, subinst._finish_loc, subinst._distance, subinst._routetable, subinst._customertable, subinst._customerpositions, subinst._earliest, subinst._latest):
+            array.flags.writeable = False
+        
+        subinst._customerwindows = OrderedDict((customer, self._customerwindows[customer]) for customer in customers)
+        
+        subinst._timematrix = self._timematrix
+        subinst._distmatrix = self._distmatrix
+        subinst._rows = indices if self._rows is None else self._rows[indices]
+        subinst._cols = indices if self._cols is None else self._cols[indices]
+        if not self._paretosets is None:
+            subinst._paretosets = self._paretosets.subset(indices[:len(subinst._vertices)])
 
-        return subinst
\ No newline at end of file
+        return subinst
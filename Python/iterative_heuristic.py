@@ -68,7 +68,8 @@ def determine_customers(instance, customers, ratio, maxcustomers):
         return None
     customer = max(customers, key = lambda k: ratio[k])
     time = instance.earliest_starttime(customer)
-    customers = filter(lambda k: instance.earliest_starttime(k) >= time-timedelta(hours=1) and instance.latest_starttime(k) <= time+timedelta(hours=1), customers)
+    candidates = set(k for k in instance.customers_between(time-timedelta(hours=1), time+timedelta(hours=1)) if instance.earliest_starttime(k) >= time-timedelta(hours=1) and instance.latest_starttime(k) <= time+timedelta(hours=1))
+    customers = filter(lambda k: k in candidates, customers)
     if not customers:
         print '[WARN] No critical customers', customer, 'Start', instance.earliest_starttime(customer), 'Finish', instance.latest_starttime(customer)
     return sorted(customers, key = lambda k: ratio[k], reverse = True)[0:min(maxcustomers, len(customers))]
@@ -110,7 +111,11 @@ if __name__ == '__main__':
     graph = None
     printer.writeInfo('Loading task graph ...')
     graphfile = config['data']['base'] + instancename + '.graph'
-    if path.isfile(graphfile + '.json.gz'):
+    if path.isfile(graphfile + '.bin'):
+        graphfile += '.bin'
+        graph = taskgraph.load_taskgraph_from_binary(graphfile, instance.dictionary)
+        printer.writeInfo('Task graph successfully loaded from %s' % graphfile)
+    elif path.isfile(graphfile + '.json.gz'):
         graphfile += '.json.gz'
         graph = taskgraph.load_taskgraph_from_json(graphfile, instance.dictionary)
         printer.writeInfo('Task graph successfully loaded from %s' % graphfile)
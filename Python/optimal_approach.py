@@ -3,13 +3,10 @@ import os
 import sys
 sys.path.append(os.path.abspath(os.getenv('SCHEDULING_CPP_PATH', '..\\x64-v120-Release')))
 import scheduling_cpp
-import itertools
-
-import time
-import numpy
-import progressbar
 
 import storage
+import pareto
+import cache
 from util import Printer
 from config import config
 
@@ -17,13 +14,18 @@ if __name__ == '__main__':
     
     parser = ArgumentParser()
     parser.add_argument('solution', type=str)
+    parser.add_argument('-p', type=int, dest='processes')
+    parser.add_argument('-m', type=int, default=256, dest='memory')
     parser.add_argument('--compress', action='store_true')
+    parser.add_argument('--binary', action='store_true')
+    parser.add_argument('--nocache', action='store_true')
     parser.add_argument('--statistics', action='store_true')
     parser.add_argument('--verbose', action='store_true')
     args = parser.parse_args()
     
     printer = Printer(verbose=args.verbose, statistics=args.statistics)
     compress = '' if args.compress else '.gz'
+    store = None if args.nocache else cache.Cache()
     solutionname = args.solution
     instancename = os.path.join(os.path.dirname(solutionname), os.path.basename(solutionname).split('.')[0])
     
@@ -48,72 +50,28 @@ if __name__ == '__main__':
     
     export = False
     
-    if instance._paretorefuelpoints is None:
+    if instance._paretosets is None:
     
-        printer.writeInfo('Determine Pareto-optimal refuelpoints ...')
-        
         export = True
-    
-        m = len(instance.vehicles)
-        n = len(instance.trips)
-        k = len(instance.refuelpoints)
-
-        starttime  = numpy.array([time.mktime(t.start_time.timetuple()) for t in itertools.chain(instance.vehicles, instance.trips)])
-        finishtime = numpy.array([time.mktime(t.finish_time.timetuple()) for t in itertools.chain(instance.vehicles, instance.trips)])
-
-        a = (finishtime[:,None] + instance._time[:(m+n),:(m+n)]) < starttime[None,:]
-
-        paretorefuelpoints = [[None] * (m + n) for _ in xrange(m + n)]
-
-        try:
-            progress = progressbar.ProgressBar(maxval=m+n, widgets=[progressbar.Bar('#', '[', ']'), ' ', progressbar.Percentage(), ' ', progressbar.Timer(), ' ', progressbar.ETA()], term_width=config['console']['width']).start()
-            progresscount = itertools.count(1)
-
-            phi = numpy.empty((4, k, m+n), dtype=numpy.float)        
-            comparison = numpy.empty((4, k, k, m+n), dtype=numpy.bool)
-            dominance = numpy.empty((k,k,m+n), dtype=numpy.bool)
-            frontier = numpy.empty((k,m+n), dtype=numpy.bool)
-            for s in xrange(m + n):
-                refueltime = starttime[None,:] - instance._time[m+n:,:m+n] - instance._time[s,m+n:,None] - finishtime[s]
-                phi[0,:,:] =            instance._costpermeter * instance._dist[s,m+n:,None]                                                                      + instance._costpermeter * instance._dist[m+n:,:m+n]
-                phi[1,:,:] =            instance._fuelpermeter * instance._dist[s,m+n:,None] + numpy.maximum( - numpy.minimum(instance._refuelpersecond * refueltime, 1)     + instance._fuelpermeter * instance._dist[m+n:,:m+n], 0)
-                phi[2,:,:] = numpy.maximum(instance._fuelpermeter * instance._dist[s,m+n:,None]               - numpy.minimum(instance._refuelpersecond * refueltime, 1), 0) + instance._fuelpermeter * instance._dist[m+n:,:m+n]
-                phi[3,:,:] =            instance._fuelpermeter * instance._dist[s,m+n:,None]               - numpy.minimum(instance._refuelpersecond * refueltime, 1)     + instance._fuelpermeter * instance._dist[m+n:,:m+n]
-                numpy.less_equal(phi[:,:,None,:], phi[:,None,:,:], comparison)
-                numpy.all(comparison, 0, dominance)
-                numpy.logical_and(dominance, numpy.invert(numpy.transpose(numpy.logical_and(dominance, numpy.tri(k,k)[:,:,None]), (1, 0, 2))), dominance)
-                numpy.any(dominance, 0, frontier)
-                numpy.logical_or(frontier, refueltime < 0, frontier)
-                numpy.invert(frontier, frontier)
-                paretorefuelpoints[s] = [numpy.flatnonzero(frontier[:,t]).tolist() for t in xrange(m+n)]
-                progress.update(progresscount.next())
-
-        except MemoryError as e:
-            progress = progressbar.ProgressBar(maxval=numpy.sum(a), widgets=[progressbar.Bar('#', '[', ']'), ' ', progressbar.Percentage(), ' ', progressbar.Timer(), ' ', progressbar.ETA()], term_width=config['console']['width']).start()
-            progresscount = itertools.count(1)
-
-            phi = numpy.empty((k,4), dtype=numpy.float)
-            for s, t in itertools.izip(*a.nonzero()):
-                refueltime = starttime[t] - instance._time[s,(m+n):] - numpy.transpose(instance._time[(m+n):,t]) - finishtime[s]
-                phi[:,0] =            instance._costpermeter * instance._dist[s,(m+n):]                                                                      + instance._costpermeter * numpy.transpose(instance._dist[(m+n):,t])
-                phi[:,1] =            instance._fuelpermeter * instance._dist[s,(m+n):] + numpy.maximum( - numpy.minimum(instance._refuelpersecond * refueltime, 1)     + instance._fuelpermeter * numpy.transpose(instance._dist[(m+n):,t]), 0)
-                phi[:,2] = numpy.maximum(instance._fuelpermeter * instance._dist[s,(m+n):]               - numpy.minimum(instance._refuelpersecond * refueltime, 1), 0) + instance._fuelpermeter * numpy.transpose(instance._dist[(m+n):,t])
-                phi[:,3] =            instance._fuelpermeter * instance._dist[s,(m+n):]               - numpy.minimum(instance._refuelpersecond * refueltime, 1)     + instance._fuelpermeter * numpy.transpose(instance._dist[(m+n):,t])
-                dominance = numpy.all(phi[:,None,:] <= phi[None,:,:], 2)
-                numpy.logical_and(dominance, numpy.invert(numpy.transpose(numpy.triu(dominance))), dominance)
-                frontier = numpy.invert(numpy.logical_or(numpy.any(dominance, 0), refueltime < 0))
-                paretorefuelpoints[s][t] = numpy.flatnonzero(frontier).tolist()
-                progress.update(progresscount.next())
-    
-        progress.finish()
-        instance._paretorefuelpoints = paretorefuelpoints
-    
-        printer.writeInfo('Pareto-optimal refuelpoints successfully determined')
+        
+        paretokey = cache.fingerprint('pareto', cache.instance_fingerprint(instance)) if store else None
+        
+        if store and store.get(paretokey, 'pareto.bin'):
+            instance._paretorefuelpoints = pareto.load_pareto_from_binary(store.get(paretokey, 'pareto.bin'))
+            printer.writeInfo('Pareto-optimal refuelpoints successfully loaded from cache')
+        else:
+            printer.writeInfo('Determine Pareto-optimal refuelpoints ...')
+        
+            instance._paretorefuelpoints = pareto.pareto_refuelpoints(instance, processes=args.processes, memory=args.memory * 2**20)
+            if store:
+                store.put(paretokey, 'pareto.bin', lambda filename: pareto.save_pareto_to_binary(instance._paretosets, filename))
+        
+            printer.writeInfo('Pareto-optimal refuelpoints successfully determined')
     
     if export:
         instancefile = config['data']['base'] + instancename + '.json%s' % compress
         printer.writeInfo('Saving instance ...')
-        storage.save_instance_to_json(instancefile, instance)
+        storage.save_instance_to_json(instancefile, instance, binary=args.binary)
         printer.writeInfo('Instance successfully saved to %s' % instancefile)
     
     solution = None
@@ -0,0 +1,180 @@
+from multiprocessing import cpu_count
+import itertools
+
+import numpy
+
+import util
+
+class ParetoSets(object):
+
+    def __init__(self, indptr, targets, offsets, indices):
+        self.indptr = indptr
+        self.targets = targets
+        self.offsets = offsets
+        self.indices = indices
+
+    @staticmethod
+    def from_pairs(n, s, t, offsets, indices):
+        indptr = numpy.zeros(n + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(s, minlength=n), out=indptr[1:])
+        return ParetoSets(indptr, numpy.asarray(t, dtype=numpy.int32), numpy.asarray(offsets, dtype=numpy.int64), numpy.asarray(indices, dtype=numpy.int32))
+
+    @staticmethod
+    def from_lists(lists):
+        pairs = [(s, t, refuelpoints) for s, row in enumerate(lists) for t, refuelpoints in enumerate(row) if refuelpoints]
+        s, t, refuelpoints = zip(*pairs) if pairs else ((), (), ())
+        offsets = numpy.zeros(len(pairs) + 1, dtype=numpy.int64)
+        numpy.cumsum([len(r) for r in refuelpoints], out=offsets[1:])
+        return ParetoSets.from_pairs(len(lists), numpy.array(s, dtype=numpy.int64), t, offsets, list(itertools.chain.from_iterable(refuelpoints)))
+
+    def number_of_vertices(self):
+        return len(self.indptr) - 1
+
+    def number_of_pairs(self):
+        return len(self.targets)
+
+    def sources(self):
+        return numpy.repeat(numpy.arange(self.number_of_vertices()), numpy.diff(self.indptr))
+
+    def refuelpoints(self, s, t):
+        lo, hi = self.indptr[s], self.indptr[s+1]
+        i = lo + numpy.searchsorted(self.targets[lo:hi], t)
+        if i < hi and self.targets[i] == t:
+            return self.indices[self.offsets[i]:self.offsets[i+1]]
+        return self.indices[:0]
+
+    def lists(self):
+        n = self.number_of_vertices()
+        empty = []
+        lists = [[empty] * n for _ in xrange(n)]
+        for s, t, lo, hi in itertools.izip(self.sources().tolist(), self.targets.tolist(), self.offsets[:-1].tolist(), self.offsets[1:].tolist()):
+            lists[s][t] = self.indices[lo:hi].tolist()
+        return lists
+
+    def subset(self, vertices):
+        inverse = numpy.full(self.number_of_vertices(), -1, dtype=numpy.int64)
+        inverse[vertices] = numpy.arange(len(vertices))
+        s, t = inverse[self.sources()], inverse[self.targets]
+        pairs = numpy.flatnonzero((s >= 0) & (t >= 0))
+        if numpy.any(numpy.diff(vertices) < 0):
+            pairs = pairs[numpy.lexsort((t[pairs], s[pairs]))]
+        counts = self.offsets[pairs+1] - self.offsets[pairs]
+        offsets = numpy.zeros(len(pairs) + 1, dtype=numpy.int64)
+        numpy.cumsum(counts, out=offsets[1:])
+        positions = numpy.repeat(self.offsets[pairs] - offsets[:-1], counts) + numpy.arange(offsets[-1])
+        return ParetoSets.from_pairs(len(vertices), s[pairs], t[pairs], offsets, self.indices[positions])
+
+def pareto_arrays(instance):
+
+    m = len(instance._vehicles)
+
+    return {
+        'vehicles': m,
+        'refuelpoints': instance.ids(instance._refuelpoints),
+        'start_time': numpy.asarray(instance._start_time),
+        'finish_time': numpy.asarray(instance._finish_time),
+        'customer': numpy.asarray(instance._customertable),
+        'route': numpy.asarray(instance._routetable),
+        'time': instance._timematrix,
+        'dist': instance._distmatrix,
+        'rows': numpy.arange(len(instance._index)) if instance._rows is None else instance._rows,
+        'cols': numpy.arange(len(instance._index)) if instance._cols is None else instance._cols,
+        'costpermeter': instance._costpermeter,
+        'fuelpermeter': instance._fuelpermeter,
+        'refuelpersecond': instance._refuelpersecond
+    }
+
+def pareto_pairs(arrays, lo, hi, memory):
+
+    m = arrays['vehicles']
+    start_time = arrays['start_time']
+    finish_time = arrays['finish_time']
+    customer = arrays['customer']
+    route = arrays['route']
+
+    trips = numpy.arange(m, len(start_time))
+    blocksize = max(1, memory / (32 * max(len(trips), 1)))
+
+    s, t = [], []
+
+    for a in xrange(lo, hi, blocksize):
+        b = min(a + blocksize, hi)
+        time = util.gather(arrays, 'time', numpy.arange(a, b)[:,None], trips[None,:])
+        feasible = (finish_time[a:b,None] + time <= start_time[None,m:]) & ((customer[a:b,None] != customer[None,m:]) | (route[a:b,None] == route[None,m:]))
+        i, j = numpy.nonzero(feasible)
+        s.append(i + a)
+        t.append(j + m)
+
+    return (numpy.concatenate(s), numpy.concatenate(t)) if s else (numpy.empty(0, dtype=numpy.int64),) * 2
+
+def pareto_frontier(arrays, s, t):
+
+    costpermeter = arrays['costpermeter']
+    fuelpermeter = arrays['fuelpermeter']
+    refuelpersecond = arrays['refuelpersecond']
+    r = arrays['refuelpoints']
+
+    time = arrays['start_time'][t,None] - util.gather(arrays, 'time', r[None,:], t[:,None]) - util.gather(arrays, 'time', s[:,None], r[None,:]) - arrays['finish_time'][s,None]
+    d_sr = util.gather(arrays, 'dist', s[:,None], r[None,:])
+    d_rt = util.gather(arrays, 'dist', r[None,:], t[:,None])
+    refuel = numpy.minimum(refuelpersecond * time, 1.0)
+
+    phi = (
+        costpermeter * (d_sr + d_rt),
+        fuelpermeter * d_sr + numpy.maximum(-refuel + fuelpermeter * d_rt, 0.0),
+        numpy.maximum(fuelpermeter * d_sr - refuel, 0.0) + fuelpermeter * d_rt,
+        fuelpermeter * d_sr - refuel + fuelpermeter * d_rt
+    )
+
+    k = time.shape[1]
+    dominance = numpy.ones((len(s), k, k), dtype=bool)
+    for column in phi:
+        dominance &= column[:,:,None] <= column[:,None,:]
+
+    dominated = numpy.any(numpy.transpose(dominance, (0, 2, 1)) & (numpy.triu(numpy.ones((k, k), dtype=bool), 1) | ~dominance), axis=2)
+
+    return ~(dominated | (time < 0.0))
+
+def pareto_block(arrays, lo, hi, memory):
+
+    k = len(arrays['refuelpoints'])
+    blocksize = max(1, memory / (16 * k * (k + 8)))
+
+    s, t = pareto_pairs(arrays, lo, hi, memory)
+    counts = numpy.empty(len(s), dtype=numpy.int64)
+    indices = []
+
+    for i in xrange(0, len(s), blocksize):
+        frontier = pareto_frontier(arrays, s[i:i+blocksize], t[i:i+blocksize])
+        counts[i:i+blocksize] = numpy.sum(frontier, axis=1)
+        indices.append(numpy.nonzero(frontier)[1].astype(numpy.int32))
+
+    return s.astype(numpy.int32), t.astype(numpy.int32), counts, numpy.concatenate(indices) if indices else numpy.empty(0, dtype=numpy.int32)
+
+def pareto_refuelpoints(instance, processes=None, memory=268435456, chunksize=None):
+
+    arrays = pareto_arrays(instance)
+    m, n = len(instance._vehicles), len(instance._trips)
+
+    processes = processes if processes else cpu_count()
+    chunksize = chunksize if chunksize else (m + n) / (16 * processes) + 1
+    chunks = [(lo, min(lo + chunksize, m + n), memory / processes) for lo in xrange(0, m + n, chunksize)]
+
+    blocks = util.map_blocks(pareto_block, arrays, chunks, processes)
+
+    blocks.sort(key=lambda block: block[0][0] if len(block[0]) else -1)
+    s, t, counts, indices = [numpy.concatenate(column) for column in zip(*blocks)]
+    offsets = numpy.zeros(len(s) + 1, dtype=numpy.int64)
+    numpy.cumsum(counts, out=offsets[1:])
+
+    return ParetoSets.from_pairs(m + n, s, t, offsets, indices)
+
+def save_pareto_to_binary(P, filename):
+
+    util.save_binary(filename, 'PARETORP', [('indptr', P.indptr), ('targets', P.targets), ('offsets', P.offsets), ('indices', P.indices)])
+
+def load_pareto_from_binary(filename):
+
+    _, arrays = util.load_binary(filename, 'PARETORP', 'binary Pareto set')
+
+    return ParetoSets(arrays['indptr'], arrays['targets'], arrays['offsets'], arrays['indices'])
@@ -2,6 +2,7 @@ from datetime import timedelta
 from itertools import izip, chain, count
 from enum import Enum
 
+import numpy
 import progressbar
 
 import osrm
@@ -79,42 +80,47 @@ class Solution:
                 t_prev = t
             assert not isinstance(t_prev, entities.RefuelPoint), '[WARN] Refuelpoint %s at the end of a duty' % t_prev
 
+        instance = self.instance
         for s, duty in ((v, self.duties[v]),) if v else self.duties.iteritems():
+            path = instance.ids(chain((s,), duty))
             e = s.fuel
+            i = path[0]
             r = None
-            for t in duty:
+            for t, j in izip(duty, path[1:]):
                 assert e >= 0, '[WARN] Fuel for driving to %s is not sufficient' % s
                 
                 if isinstance(t, entities.Trip):
-                    time = (t.start_time - s.finish_time).total_seconds() - (self.instance.time(s, r) + self.instance.time(r, t) if r else self.instance.time(s, t))
+                    time = instance._start_time[j] - instance._finish_time[i] - (instance.time_many(i, r) + instance.time_many(r, j) if not r is None else instance.time_many(i, j))
                     assert time >= 0, '[WARN] Not enough time for driving from %s to %s' % (s, t)
                     
-                    if r:
-                        e -= self.instance.fuel(s, r)
+                    if not r is None:
+                        e -= instance.fuel_many(i, r)
                         assert e >= 0, '[WARN] Refuel point between %s and %s cannot be reached' % (s, t)
-                        e = min(e + self.instance._refuelpersecond * time, 1) - self.instance.fuel(r, t) - self.instance.fuel(t)
+                        e = min(e + instance._refuelpersecond * time, 1) - instance.fuel_many(r, j) - instance.fuel_many(j)
                     else:
-                        e -= (self.instance.fuel(s, t) + self.instance.fuel(t))
+                        e -= (instance.fuel_many(i, j) + instance.fuel_many(j))
                     
                     r = None
                     s = t
+                    i = j
                 
                 else:
-                    r = t
+                    r = j
             assert e >= 0, '[WARN] Fuel for driving to %s is not sufficient' %s
 
     def evaluate(self, v=None):
         
-        cost = 0.0 if v else sum(self.instance.route_cost(route) for route in self.customers.itervalues())
+        instance = self.instance
+        cost = 0.0 if v else sum(instance.route_cost(route) for route in self.customers.itervalues())
         
-        for s, duty in ((v, self.duties[v]),) if v else self.duties.iteritems():
-            for t in duty:
-                cost += self.instance.cost(s, t)
-                if isinstance(t, entities.Trip):
-                    cost += self.instance.cost(t)
-                s = t
+        paths = [instance.ids(chain((s,), duty)) for s, duty in (((v, self.duties[v]),) if v else self.duties.iteritems())]
+        if paths:
+            src = numpy.concatenate([path[:-1] for path in paths])
+            dst = numpy.concatenate([path[1:] for path in paths])
+            trips = dst[(dst >= len(instance._vehicles)) & (dst < len(instance._vertices))]
+            cost += numpy.sum(instance.cost_many(src, dst)) + numpy.sum(instance.cost_many(trips))
                 
-        return cost
+        return float(cost)
 
     def evaluate_detailed(self, v=None):
         
@@ -1,8 +1,8 @@
 import os
-import gzip
 import json
 from datetime import datetime, timedelta
 from collections import OrderedDict
+from itertools import izip
 
 import numpy
 import progressbar
@@ -10,7 +10,10 @@ import progressbar
 import entities
 from instance import Instance
 import xpress
+import compression
 import solution
+import pareto
+import util
 from config import config
 
 def load_vehicles_from_json(filename):
@@ -31,20 +34,16 @@ def save_refuelpoints_to_json(refuelpoints, filename):
     with open(filename,'w') as f:
         json.dump({'refuelpoints': [refuelpoint.__json__() for refuelpoint in refuelpoints]}, f, sort_keys=True)
         
-def load_instance_from_json(filename, compress=None):
+def load_instance_from_json(filename, compress=None, dtype=float, mmap_mode='r'):
     
-    if compress is None:
-        compress = os.path.splitext(filename)[1] == '.gz'
-    if compress and not os.path.splitext(filename)[1] == '.gz':
-        filename += '.gz'
-    
-    with (gzip.open(filename, 'rb') if compress else open(filename, 'r')) as f:
+    with compression.open_file(filename, 'r', compress) as f:
         data = json.load(f)
     
     customers = OrderedDict((customer['id'], [route['id'] for route in customer['routes']]) for customer in data['customers'])
-    routes = OrderedDict((route['id'], [entities.Trip.parse(trip) for trip in route['trips']]) for customer in data['customers'] for route in customer['routes'])
+    trips = iter(entities.Trip.parse_many(trip for customer in data['customers'] for route in customer['routes'] for trip in route['trips']))
+    routes = OrderedDict((route['id'], [trips.next() for _ in route['trips']]) for customer in data['customers'] for route in customer['routes'])
     routecost = OrderedDict((route['id'], route['cost']) for customer in data['customers'] for route in customer['routes'])
-    vehicles = [entities.Vehicle.parse(vehicle) for vehicle in data['vehicles']]
+    vehicles = entities.Vehicle.parse_many(data['vehicles'])
     refuelpoints = [entities.RefuelPoint.parse(refuelpoint) for refuelpoint in data['refuelpoints']]
     
     fuelpermeter = data['fuelpermeter']
@@ -58,19 +57,83 @@ def load_instance_from_json(filename, compress=None):
     inst._basename = basename
     
     if 'time' in data:
-        inst._time = numpy.array(data['time'], dtype = float)
+        inst._time = matrix_from_json(data.pop('time'), numpy.trunc, dtype)
     
     if 'dist' in data:
-        inst._dist = numpy.array(data['dist'], dtype = float)
+        inst._dist = matrix_from_json(data.pop('dist'), numpy.rint, dtype)
+    
+    if data.get('binary'):
+        load_instance_matrices(filename, inst, mmap_mode=mmap_mode)
+        if numpy.dtype(dtype).kind != 'f' and inst._timematrix.dtype.kind == 'f':
+            inst.compact(dtype)
     
     if 'paretorefuelpoints' in data:
         inst._paretorefuelpoints = data['paretorefuelpoints']
+    elif data.get('pareto'):
+        load_instance_pareto(filename, inst)
     
     return inst
 
-def save_instance_to_json(filename, instance, compress=None):
+def matrix_from_json(rows, rounding, dtype=float):
+    matrix = numpy.empty((len(rows), len(rows[0]) if rows else 0), dtype=dtype)
+    while rows:
+        row = rows.pop()
+        matrix[len(rows)] = row if numpy.dtype(dtype).kind == 'f' else rounding(row)
+    return matrix
+
+def matrix_basename(filename):
+    basename, extension = os.path.splitext(filename)
+    return os.path.splitext(basename)[0] if extension in compression.extensions else basename
+
+def mapped_from(array, filename):
+    return isinstance(array, numpy.memmap) and not array.filename is None and os.path.abspath(array.filename) == os.path.abspath(filename)
 
-    data = {
+def save_array(filename, array):
+    if not mapped_from(array, filename):
+        numpy.save(filename, array)
+
+def save_instance_matrices(filename, instance, dtype=numpy.int32):
+    
+    basename = matrix_basename(filename)
+    time, dist = instance._timematrix, instance._distmatrix
+    if not dtype is None:
+        time, dist = numpy.trunc(time).astype(dtype), numpy.rint(dist).astype(dtype)
+    save_array(basename + '.time.npy', time)
+    save_array(basename + '.dist.npy', dist)
+    for name, array in (('rows', instance._rows), ('cols', instance._cols)):
+        if not array is None:
+            save_array(basename + '.%s.npy' % name, array)
+        elif os.path.isfile(basename + '.%s.npy' % name):
+            os.remove(basename + '.%s.npy' % name)
+    return basename + '.time.npy', basename + '.dist.npy'
+
+def load_instance_matrices(filename, instance, mmap_mode='r'):
+    
+    basename = matrix_basename(filename)
+    if os.path.isfile(basename + '.rows.npy'):
+        instance.set_matrices(*(numpy.load(basename + '.%s.npy' % name, mmap_mode=mmap_mode) for name in ('time', 'dist', 'rows', 'cols')))
+    else:
+        instance.open_matrices(basename + '.time.npy', basename + '.dist.npy', mmap_mode=mmap_mode)
+    return instance
+
+def save_instance_pareto(filename, instance):
+    
+    basename = matrix_basename(filename)
+    if instance._paretosets is None:
+        if os.path.isfile(basename + '.pareto.bin'):
+            os.remove(basename + '.pareto.bin')
+    elif not mapped_from(instance._paretosets.indptr, basename + '.pareto.bin'):
+        pareto.save_pareto_to_binary(instance._paretosets, basename + '.pareto.bin')
+    return basename + '.pareto.bin'
+
+def load_instance_pareto(filename, instance):
+    
+    basename = matrix_basename(filename)
+    instance._paretorefuelpoints = pareto.load_pareto_from_binary(basename + '.pareto.bin')
+    return instance
+
+def instance_to_json(instance):
+    return {
             'fuelpermeter': instance._fuelpermeter,
             'refuelpersecond': instance._refuelpersecond,
             'costpermeter': instance._costpermeter,
@@ -86,22 +149,108 @@ def save_instance_to_json(filename, instance, compress=None):
                     } for route in routes]
             } for customer, routes in instance._customers.iteritems()]
         }
+
+def save_instance_to_json(filename, instance, compress=None, binary=False):
+
+    data = instance_to_json(instance)
     
-    if not instance._time is None:
-        data['time'] = instance._time.tolist()
-    if not instance._dist is None:
-        data['dist'] = instance._dist.tolist()
-    if not instance._paretorefuelpoints is None:
-        data['paretorefuelpoints'] = instance._paretorefuelpoints
-        
-    if compress is None:
-        compress = os.path.splitext(filename)[1] == '.gz'
-    if compress and not os.path.splitext(filename)[1] == '.gz':
-        filename += '.gz'
+    filename, compress = compression.codec(filename, compress)
+    
+    if binary and not (instance._timematrix is None or instance._distmatrix is None):
+        data['binary'] = True
+        save_instance_matrices(filename, instance, dtype=None)
+    else:
+        if not instance._time is None:
+            data['time'] = instance._time.tolist()
+        if not instance._dist is None:
+            data['dist'] = instance._dist.tolist()
     
-    with (gzip.open(filename, 'wb') if compress else open(filename, 'w')) as f:
+    if not instance._paretosets is None:
+        data['pareto'] = True
+    save_instance_pareto(filename, instance)
+    
+    with compression.open_file(filename, 'w', compress, parallel=True) as f:
         json.dump(data, f, sort_keys=True)
         
+def save_instance_to_index(filename, instance):
+    
+    basename = matrix_basename(filename)
+    save_instance_matrices(filename, instance, dtype=None)
+    save_instance_pareto(filename, instance)
+    
+    offsets = [0]
+    with open(basename + '.customers.jsonl', 'wb') as f:
+        for customer, routes in instance._customers.iteritems():
+            line = json.dumps({
+                'id': customer,
+                'routes': [{
+                    'id': route,
+                    'cost': instance._routecost.get(route),
+                    'trips': [trip.__json__() for trip in instance._routes.get(route)],
+                    'indices': [instance._index[trip] for trip in instance._routes.get(route)]
+                    } for route in routes]
+            }, sort_keys=True) + '\n'
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    numpy.save(basename + '.customers.npy', numpy.column_stack((instance._earliest, instance._latest, offsets[:-1], offsets[1:])))
+    
+    data = instance_to_json(instance)
+    data['customers'] = instance._customers.keys()
+    data['trips'] = len(instance._trips)
+    if not instance._paretosets is None:
+        data['pareto'] = True
+    with open(basename + '.index.json', 'w') as f:
+        json.dump(data, f, sort_keys=True)
+
+def load_instance_window(filename, start=None, finish=None, customers=None, mmap_mode='r'):
+    
+    basename = matrix_basename(filename)
+    with open(basename + '.index.json', 'r') as f:
+        data = json.load(f)
+    
+    table = numpy.load(basename + '.customers.npy', mmap_mode='r')
+    selected = numpy.ones(len(table), dtype=bool)
+    if not start is None:
+        selected &= table[:,1] >= util.to_seconds(start)
+    if not finish is None:
+        selected &= table[:,0] <= util.to_seconds(finish)
+    if not customers is None:
+        customers = set(customers)
+        selected &= numpy.array([customer in customers for customer in data['customers']], dtype=bool)
+    if not numpy.any(selected):
+        raise ValueError('No customers selected from %s' % filename)
+    
+    records = []
+    with open(basename + '.customers.jsonl', 'rb') as f:
+        for lo, hi in table[selected,2:].astype(numpy.int64).tolist():
+            f.seek(lo)
+            records.append(json.loads(f.read(hi - lo)))
+    
+    trips = iter(entities.Trip.parse_many(trip for customer in records for route in customer['routes'] for trip in route['trips']))
+    routes = OrderedDict((route['id'], [trips.next() for _ in route['trips']]) for customer in records for route in customer['routes'])
+    indices = dict((trip, index) for customer in records for route in customer['routes'] for trip, index in izip(routes[route['id']], route['indices']))
+    vehicles = entities.Vehicle.parse_many(data['vehicles'])
+    refuelpoints = [entities.RefuelPoint.parse(refuelpoint) for refuelpoint in data['refuelpoints']]
+    indices.update((vehicle, index) for index, vehicle in enumerate(sorted(vehicles, key = lambda k: k.id)))
+    indices.update((refuelpoint, len(vehicles) + data['trips'] + index) for index, refuelpoint in enumerate(sorted(refuelpoints, key = lambda k: k.id)))
+    
+    inst = Instance(vehicles,
+        OrderedDict((customer['id'], [route['id'] for route in customer['routes']]) for customer in records),
+        routes,
+        OrderedDict((route['id'], route['cost']) for customer in records for route in customer['routes']),
+        refuelpoints, data['fuelpermeter'], data['refuelpersecond'], data['costpermeter'], data['costpercar'])
+    inst._basename = basename
+    
+    ids = numpy.array([indices[s] for s in sorted(inst._index, key=inst._index.get)], dtype=numpy.int64)
+    rows = numpy.load(basename + '.rows.npy', mmap_mode='r')[ids] if os.path.isfile(basename + '.rows.npy') else ids
+    cols = numpy.load(basename + '.cols.npy', mmap_mode='r')[ids] if os.path.isfile(basename + '.cols.npy') else ids
+    inst.set_matrices(numpy.load(basename + '.time.npy', mmap_mode=mmap_mode), numpy.load(basename + '.dist.npy', mmap_mode=mmap_mode), rows, cols)
+    
+    if data.get('pareto'):
+        inst._paretorefuelpoints = pareto.load_pareto_from_binary(basename + '.pareto.bin').subset(ids[:len(inst._vertices)])
+    
+    return inst
+
 def load_partial_solution_from_xpress(filename, previous_solution, instance, endpoints, compress=None):
     
     assert not instance is None
@@ -113,15 +262,8 @@ def load_partial_solution_from_xpress(filename, previous_solution, instance, end
         'Duties': xpress.parser_dict((parser_vehicles,), xpress.parser_list(parser_trips))
     })
     
-    if compress is None:
-        compress = os.path.splitext(filename)[1] == '.gz'
-    if compress and not os.path.splitext(filename)[1] == '.gz':
-        filename += '.gz'
-
-    with (gzip.open(filename, 'rb') if compress else open(filename, 'r')) as f:
-        data = f.read()
-    
-    partial_duties = parser_solution.parse(data)['Duties']
+    with compression.open_file(filename, 'r', compress) as f:
+        partial_duties = parser_solution.read(f)['Duties']
     previous_duties = previous_solution.duties 
     
     duties = {}
@@ -170,26 +312,17 @@ def load_solution_from_xpress(filename, instance=None, compress=None):
             
     parser_vehicles = xpress.parser_object(instance.vehicles)
     parser_trips = xpress.parser_object(instance.trips + instance.refuelpoints, **{'': None})
-    parser_fuel = xpress.parser_real()
 
     parser_solution = xpress.parser_definitions({
         'Duties': xpress.parser_dict((parser_vehicles,), xpress.parser_list(parser_trips)),
-        'Fuel_Min': xpress.parser_dict((parser_vehicles,), xpress.parser_list(parser_fuel)),
-        'Fuel_Max': xpress.parser_dict((parser_vehicles,), xpress.parser_list(parser_fuel)),
+        'Fuel_Min': xpress.parser_dict((parser_vehicles,), xpress.parser_array()),
+        'Fuel_Max': xpress.parser_dict((parser_vehicles,), xpress.parser_array()),
     })
     
-    if compress is None:
-        compress = os.path.splitext(filename)[1] == '.gz'
-    if compress and not os.path.splitext(filename)[1] == '.gz':
-        filename += '.gz'
-
-    with (gzip.open(filename, 'rb') if compress else open(filename, 'r')) as f:
-        data = f.read()
+    filename, compress = compression.codec(filename, compress)
     
-    #progress = progressbar.ProgressBar(maxval=len(data), widgets=[progressbar.Bar('#', '[', ']'), ' ', progressbar.Percentage(), ' ', progressbar.Timer(), ' ', progressbar.ETA()], term_width=config['console']['width']).start()
-    #solution_duties = parser_solution.parse(data, progress)
-    #progress.finish()
-    solution_dict = parser_solution.parse(data)
+    with compression.open_file(filename, 'r', compress) as f:
+        solution_dict = parser_solution.read(f)
 
     sol = solution.Solution(instance, solution_dict['Duties'])
     
@@ -213,12 +346,7 @@ def save_solution_to_xpress(filename, solution, compress=None):
         ('Duties', ((xpress.xpress_index(s), (xpress.xpress_index(t) for t in duty)) for s, duty in solution.duties.iteritems()))
     ])
     
-    if compress is None:
-        compress = os.path.splitext(filename)[1] == '.gz'
-    if compress and not os.path.splitext(filename)[1] == '.gz':
-        filename += '.gz'
-    
-    with (gzip.open(filename, 'wb') if compress else open(filename, 'w')) as f:
+    with compression.open_file(filename, 'w', compress) as f:
         xpress.xpress_write(f, data)
 
 ###############################################################################
@@ -305,14 +433,17 @@ def load_instance_from_json_customer(filename):
     
     with open(filename) as f:
         data = json.load(f)
+    
+    start_times = iter(util.parse_times(trip['start']['time'] for customer in data['customers'] for trip in customer['trips']))
+    finish_times = iter(util.parse_times(trip['finish']['time'] for customer in data['customers'] for trip in customer['trips']))
         
     tmp_customers = OrderedDict((
         customer['id'],
         [ entities.Trip(
             location_id=trip['location_id'],
             vehicle_vin=trip['vehicle_vin'],
-            start_time=datetime.strptime(trip['start']['time'], '%Y-%m-%d %H:%M:%S'),
-            finish_time=datetime.strptime(trip['finish']['time'], '%Y-%m-%d %H:%M:%S'),
+            start_time=start_times.next(),
+            finish_time=finish_times.next(),
             distance=trip['distance'],
             servicedrive=trip['servicedrive'],
             start_longitude=trip['start']['lon'],
@@ -339,9 +470,9 @@ def load_instance_from_json_customer(filename):
         vehicle_id=vehicle['id'],
         longitude=vehicle['coordinates']['lon'],
         latitude=vehicle['coordinates']['lat'],
-        start_time=datetime.strptime(vehicle['time'], '%Y-%m-%d %H:%M:%S'),
+        start_time=start_time,
         fuel=vehicle['fuel']
-    ) for vehicle in data['vehicles'] ]
+    ) for vehicle, start_time in izip(data['vehicles'], util.parse_times(vehicle['time'] for vehicle in data['vehicles'])) ]
     
     refuelpoints = [ entities.RefuelPoint(
         refuelpoint_id=refuelpoint['id'],
@@ -1,215 +1,506 @@
-from multiprocessing import Pool
-import os
-import gzip
+from multiprocessing import cpu_count
 import itertools
 from collections import OrderedDict
 import json
 
-import networkx
-import progressbar
+import numpy
 
 import entities
 import util
 import xpress
-from config import config
+import compression
 
-def create_taskgraph_preprocessing(args):
-    
-    instance, vertices = args
-    edges = []
-    
-    for s in (vertices if vertices else instance.vertices):
-        for t in instance.trips:
-            time = t.start_time - (s.start_time if isinstance(s, entities.Vehicle) else s.finish_time)
-            if instance.timedelta(s,t) <= time:
-                filtered = [r for r in instance.refuelpoints if instance.dist(s,r) <= instance.maxrange and instance.dist(r,t) <= instance.maxrange and instance.timedelta(s, r) + instance.timedelta(r, t) <= time]
-                
-                try:
-                    p = min(filtered, key = lambda k: instance.dist(s, k) + instance.dist(k, t))
-                except (ValueError):
-                    p = None
+class TaskGraph(object):
+    
+    node_attributes = ('f0', 'ft', 'ct', 'fmin', 'fmax')
+    edge_attributes = ('fe', 'fg', 'fh', 'fd', 'fr', 'ce', 'cd')
+    
+    subgraph_cachesize = 32
+    
+    def __init__(self, nodes, nodedata, indptr, indices, edgedata, refuelpoint, refuelpoints, **graph):
+        self.nodes = list(nodes)
+        self.indptr = numpy.asarray(indptr, dtype=numpy.int64)
+        self.indices = numpy.asarray(indices, dtype=numpy.int32)
+        self.nodedata = dict((name, numpy.asarray(nodedata[name], dtype=float) if name in nodedata else numpy.full(len(self.nodes), numpy.nan)) for name in TaskGraph.node_attributes)
+        self.edgedata = dict((name, numpy.asarray(edgedata[name], dtype=float) if name in edgedata else numpy.full(len(self.indices), numpy.nan)) for name in TaskGraph.edge_attributes)
+        self.refuelpoint = numpy.asarray(refuelpoint, dtype=numpy.int32)
+        self.refuelpoints = list(refuelpoints)
+        self.graph = graph
+        self._index = None
+        self._labels = None
+        self._sources = None
+        self._predecessors = None
+        self._subgraphs = OrderedDict()
+    
+    @staticmethod
+    def from_edges(nodes, nodedata, source, target, edgedata, refuelpoint, refuelpoints, **graph):
+        n = len(nodes)
+        order = numpy.lexsort((target, source))
+        indptr = numpy.zeros(n + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(source, minlength=n), out=indptr[1:])
+        return TaskGraph(nodes, nodedata, indptr, numpy.asarray(target)[order], dict((name, numpy.asarray(column)[order]) for name, column in edgedata.iteritems()), numpy.asarray(refuelpoint)[order], refuelpoints, **graph)
+    
+    def number_of_nodes(self):
+        return len(self.nodes)
+    
+    def number_of_edges(self):
+        return len(self.indices)
+    
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = {v: i for i, v in enumerate(self.nodes)}
+        return self._index
+    
+    @property
+    def labels(self):
+        if self._labels is None:
+            self._labels = [v if isinstance(v, basestring) else xpress.xpress_index(v) for v in self.nodes]
+        return self._labels
+    
+    @property
+    def sources(self):
+        if self._sources is None:
+            self._sources = numpy.repeat(numpy.arange(len(self.nodes), dtype=numpy.int32), numpy.diff(self.indptr))
+        return self._sources
+    
+    @property
+    def attributed(self):
+        return ~numpy.isnan(self.edgedata['fe'])
+    
+    def node_id(self, v):
+        return self.index[v]
+    
+    def node_ids(self, vs):
+        index = self.index
+        return numpy.fromiter((index[v] for v in vs), dtype=numpy.int64)
+    
+    def out_edges(self, i):
+        return numpy.arange(self.indptr[i], self.indptr[i+1])
+    
+    def in_edges(self, i):
+        if self._predecessors is None:
+            order = numpy.argsort(self.indices, kind='mergesort')
+            indptr = numpy.zeros(len(self.nodes) + 1, dtype=numpy.int64)
+            numpy.cumsum(numpy.bincount(self.indices, minlength=len(self.nodes)), out=indptr[1:])
+            self._predecessors = indptr, order
+        indptr, order = self._predecessors
+        return order[indptr[i]:indptr[i+1]]
+    
+    def successors(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i+1]]
+    
+    def predecessors(self, i):
+        return self.sources[self.in_edges(i)]
+    
+    def edge_id(self, i, j):
+        lo, hi = self.indptr[i], self.indptr[i+1]
+        k = lo + numpy.searchsorted(self.indices[lo:hi], j)
+        return k if k < hi and self.indices[k] == j else -1
+    
+    def edge_data(self, e):
+        if numpy.isnan(self.edgedata['fe'][e]):
+            return {}
+        attr = dict((name, float(self.edgedata[name][e])) for name in TaskGraph.edge_attributes)
+        attr['refuelpoint'] = self.refuelpoints[self.refuelpoint[e]] if self.refuelpoint[e] >= 0 else None
+        return attr
+    
+    def node_data(self, i):
+        return dict((name, float(self.nodedata[name][i])) for name in TaskGraph.node_attributes if not numpy.isnan(self.nodedata[name][i]))
+    
+    def get_edge_data(self, u, v, default=None):
+        e = self.edge_id(self.index[u], self.index[v])
+        return self.edge_data(e) if e >= 0 else default
 
-                edge = (s, t, {
-                    'refuelpoint': p,
-                    'fe': instance.dist(s, t) * instance._fuelpermeter,
-                    'fg': instance.dist(s, p) * instance._fuelpermeter if p else 1.1,
-                    'fh': instance.dist(p, t) * instance._fuelpermeter if p else 1.1,
-                    'fd': (instance.dist(s, p) + instance.dist(p, t) - instance.dist(s, t)) * instance._fuelpermeter if p else 1.1,
-                    'fr': min((t.start_time - (s.start_time if isinstance(s, entities.Vehicle) else s.finish_time) - instance.timedelta(s, p) - instance.timedelta(p, t)).total_seconds() * instance._refuelpersecond, 1.0) if p else 0.0,
-                    'ce': instance.dist(s, t) * instance._costpermeter,
-                    'cd': (instance.dist(s, p) + instance.dist(p, t) - instance.dist(s, t)) * instance._costpermeter if p else 0.0
-                })
-                
-                if edge[2]['refuelpoint']:
-                    if edge[2]['fd'] >= edge[2]['fr'] or edge[2]['fd']/instance._fuelpermeter > 2500.0 or edge[2]['fr']/instance._refuelpersecond < 1800.0:
-                        edge[2]['refuelpoint'] = None
-                        edge[2]['fg'] = 1.1
-                        edge[2]['fh'] = 1.1
-                        edge[2]['fd'] = 1.1
-                        edge[2]['fr'] = 0.0
-                    else:
-                        if edge[2]['fg'] + edge[2]['fh'] < edge[2]['fe']:
-                            edge[2]['fe'] = edge[2]['fg'] + edge[2]['fh']
-                            edge[2]['fd'] = 0.0
-                            edge[2]['ce'] = edge[2]['fe'] * (instance._costpermeter/instance._fuelpermeter)
-                            edge[2]['cd'] = 0.0
-                edges.append(edge)
-                
-    return edges
+def xpress_nodes(G, cls):
+    return (label for v, label in itertools.izip(G.nodes, G.labels) if isinstance(v, cls))
 
-def create_taskgraph(instance):
-    
-    ds = 'DEPOTSTART'
-    de = 'DEPOTEND'
+def xpress_adjacency(G, predecessors=False):
+    labels = G.labels
+    return ((labels[i], (labels[j] for j in (G.predecessors(i) if predecessors else G.successors(i)).tolist())) for i in xrange(G.number_of_nodes()))
 
-    G = networkx.DiGraph(ds=ds, de=de, fuelpermeter=instance._fuelpermeter, refuelpersecond=instance._refuelpersecond)
+def xpress_node_values(G, name):
+    labels = G.labels
+    column = G.nodedata[name]
+    nodes = numpy.flatnonzero(~numpy.isnan(column))
+    return ((labels[i], value) for i, value in itertools.izip(nodes.tolist(), column[nodes].tolist()))
 
-    G.add_node(ds)
-    G.add_node(de)
+def xpress_edge_values(G, name):
+    labels = G.labels
+    column = G.edgedata[name]
+    edges = numpy.flatnonzero(~numpy.isnan(column))
+    return (((labels[i], labels[j]), value) for i, j, value in itertools.izip(G.sources[edges].tolist(), G.indices[edges].tolist(), column[edges].tolist()))
 
-    G.add_nodes_from((s, {
-        'f0': s.fuel
-    }) for s in instance.vehicles)
+def xpress_edge_refuelpoints(G):
+    labels = G.labels
+    refuelpoints = [xpress.xpress_index(r) for r in G.refuelpoints] + ['']
+    edges = numpy.flatnonzero(G.attributed)
+    return (((labels[i], labels[j]), refuelpoints[r]) for i, j, r in itertools.izip(G.sources[edges].tolist(), G.indices[edges].tolist(), G.refuelpoint[edges].tolist()))
 
-    G.add_nodes_from((t, {
-        'ft': t.distance * instance._fuelpermeter,
-        'ct': t.distance * instance._costpermeter,
-        'fmin': min(map(lambda k: instance.dist(t, k)*instance._fuelpermeter, instance.refuelpoints)),
-        'fmax': 1 - min(map(lambda k: instance.dist(k, t)*instance._fuelpermeter, instance.refuelpoints))
-    }) for t in instance._trips)
+def taskgraph_arrays(instance):
+    
+    m = len(instance._vehicles)
+    vertices = instance._vertexindices
+    start_time = instance._start_time[vertices[m:]]
+    refuelindptr, refuelindices = instance.refuelpoint_index()
+    
+    return {
+        'vertices': vertices,
+        'trips': vertices[m:],
+        'refuelpoints': instance.ids(instance._refuelpoints),
+        'refuelindptr': refuelindptr,
+        'refuelindices': refuelindices,
+        'finish_time': instance._finish_time[vertices],
+        'start_time': start_time,
+        'start_order': numpy.argsort(start_time, kind='mergesort'),
+        'time': instance._timematrix,
+        'dist': instance._distmatrix,
+        'rows': numpy.arange(len(instance._index)) if instance._rows is None else instance._rows,
+        'cols': numpy.arange(len(instance._index)) if instance._cols is None else instance._cols,
+        'fuelpermeter': instance._fuelpermeter,
+        'refuelpersecond': instance._refuelpersecond,
+        'costpermeter': instance._costpermeter,
+        'maxrange': instance.maxrange
+    }
 
-    G.add_edges_from((ds, s) for s in instance.vehicles)
+def taskgraph_windows(arrays, sources, order, horizon=None):
     
-    pool = Pool(4)
+    start_time = arrays['start_time'][order]
+    finish_time = arrays['finish_time'][sources]
+    
+    lo = numpy.searchsorted(start_time, finish_time, side='left')
+    hi = numpy.searchsorted(start_time, finish_time + horizon.total_seconds(), side='right') if horizon is not None else numpy.full(len(sources), len(start_time), dtype=numpy.int64)
+    
+    return lo, numpy.maximum(lo, hi)
 
-    original = {t: t for t in itertools.chain(instance._vehicles, instance._refuelpoints, instance._trips)}
+def taskgraph_edges(arrays, sources=None, targets=None, blocksize=1048576, horizon=None):
+    
+    vertices = arrays['vertices']
+    trips = arrays['trips']
+    refuelpoints = arrays['refuelpoints']
+    time = lambda src, dst: numpy.trunc(util.gather(arrays, 'time', src, dst))
+    dist = lambda src, dst: util.gather(arrays, 'dist', src, dst)
+    fuelpermeter = arrays['fuelpermeter']
+    refuelpersecond = arrays['refuelpersecond']
+    costpermeter = arrays['costpermeter']
+    maxrange = arrays['maxrange']
+    
+    sources = numpy.arange(len(vertices)) if sources is None else numpy.asarray(sources, dtype=numpy.int64)
+    chunk = max(1, blocksize / max(len(refuelpoints), 1))
+    
+    order = arrays['start_order']
+    if targets is not None:
+        selected = numpy.zeros(len(trips), dtype=bool)
+        selected[targets] = True
+        order = order[selected[order]]
+    
+    lo, hi = taskgraph_windows(arrays, sources, order, horizon)
+    candidates = numpy.concatenate(([0], numpy.cumsum(hi - lo)))
     
-    n = int(len(instance.vertices)/64)+1
-    progress = progressbar.ProgressBar(maxval=64, widgets=[progressbar.Bar('#', '[', ']'), ' ', progressbar.Percentage(), ' ', progressbar.Timer(), ' ', progressbar.ETA()], term_width=config['console']['width']).start()
-    progresscount = itertools.count(1)
+    edges = []
     
-    for edges in pool.imap_unordered(create_taskgraph_preprocessing, ((instance, these) for these in util.grouperList(instance.vertices, n))):
-        for s, t, attr in edges:
-            attr['refuelpoint'] = original[attr['refuelpoint']] if attr['refuelpoint'] else None
-            G.add_edge(original[s], original[t], attr)
-        progress.update(progresscount.next())
+    block = 0
+    while block < len(sources):
+        
+        end = max(block + 1, numpy.searchsorted(candidates, candidates[block] + blocksize, side='right') - 1)
+        lengths = hi[block:end] - lo[block:end]
+        rows = numpy.repeat(numpy.arange(block, end), lengths)
+        offsets = numpy.arange(len(rows)) - numpy.repeat(candidates[block:end] - candidates[block], lengths)
+        block = end
+        
+        s_pos = sources[rows]
+        t_pos = order[lo[rows] + offsets]
+        gap = arrays['start_time'][t_pos] - arrays['finish_time'][s_pos]
+        i = numpy.flatnonzero(time(vertices[s_pos], trips[t_pos]) <= gap)
+        
+        for k in xrange(0, len(i), chunk):
+            
+            a = s_pos[i[k:k+chunk]]
+            b = t_pos[i[k:k+chunk]]
+            u = vertices[a]
+            v = trips[b]
+            g = gap[i[k:k+chunk]]
+            
+            d_st = dist(u, v)
+            
+            lengths = arrays['refuelindptr'][u + 1] - arrays['refuelindptr'][u]
+            pair = numpy.repeat(numpy.arange(len(a)), lengths)
+            q = arrays['refuelindices'][numpy.repeat(arrays['refuelindptr'][u] - numpy.cumsum(lengths) + lengths, lengths) + numpy.arange(len(pair))]
+            w = refuelpoints[q]
+            d_sr = dist(u[pair], w)
+            d_rt = dist(w, v[pair])
+            feasible = numpy.flatnonzero((d_rt <= maxrange) & (time(u[pair], w) + time(w, v[pair]) <= g[pair]))
+            
+            ranking = numpy.lexsort((q[feasible], d_sr[feasible] + d_rt[feasible], pair[feasible]))
+            pair, q = pair[feasible[ranking]], q[feasible[ranking]]
+            first = numpy.concatenate(([True], pair[1:] != pair[:-1])) if len(pair) else numpy.zeros(0, dtype=bool)
+            p = numpy.full(len(a), -1, dtype=numpy.int64)
+            p[pair[first]] = q[first]
+            refuel = p >= 0
+            r = refuelpoints[numpy.maximum(p, 0)] if len(refuelpoints) else p
+            
+            d_sp = numpy.where(refuel, dist(u, r), 0.0)
+            d_pt = numpy.where(refuel, dist(r, v), 0.0)
+            
+            fe = d_st * fuelpermeter
+            fg = numpy.where(refuel, d_sp * fuelpermeter, 1.1)
+            fh = numpy.where(refuel, d_pt * fuelpermeter, 1.1)
+            fd = numpy.where(refuel, (d_sp + d_pt - d_st) * fuelpermeter, 1.1)
+            fr = numpy.where(refuel, numpy.minimum((g - time(u, r) - time(r, v)) * refuelpersecond, 1.0), 0.0)
+            ce = d_st * costpermeter
+            cd = numpy.where(refuel, (d_sp + d_pt - d_st) * costpermeter, 0.0)
+            
+            dropped = refuel & ((fd >= fr) | (fd / fuelpermeter > 2500.0) | (fr / refuelpersecond < 1800.0))
+            refuel &= ~dropped
+            fg[dropped] = 1.1
+            fh[dropped] = 1.1
+            fd[dropped] = 1.1
+            fr[dropped] = 0.0
+            
+            shortcut = refuel & (fg + fh < fe)
+            fe[shortcut] = fg[shortcut] + fh[shortcut]
+            fd[shortcut] = 0.0
+            ce[shortcut] = fe[shortcut] * (costpermeter / fuelpermeter)
+            cd[shortcut] = 0.0
+            
+            edges.append((a, b, numpy.where(refuel, p, -1), fe, fg, fh, fd, fr, ce, cd))
+    
+    if not edges:
+        return (numpy.empty(0, dtype=numpy.int64),) * 3 + (numpy.empty(0, dtype=float),) * len(TaskGraph.edge_attributes)
+    return tuple(numpy.concatenate(column) for column in zip(*edges))
+
+def taskgraph_block(arrays, lo, hi, horizon):
     
-    #for edges in create_taskgraph_preprocessing((instance, instance.vertices)):
-    #    for s, t, attr in edges:
-    #        attr['refuelpoint'] = original[attr['refuelpoint']] if attr['refuelpoint'] else None
-    #        G.add_edge(original[s], original[t], attr)
+    columns = taskgraph_edges(arrays, numpy.arange(lo, hi), horizon=horizon)
     
-    progress.finish()
+    return tuple(column.astype(numpy.int32) for column in columns[:3]) + columns[3:]
 
-    pool.terminate()
-    pool.join()
+def create_taskgraph_nodes(instance):
+    
+    ds = 'DEPOTSTART'
+    de = 'DEPOTEND'
+    
+    vehicles = instance.vehicles
+    trips = instance.trips
+    m, n = len(vehicles), len(trips)
+    nodes = [ds, de] + vehicles + trips
+    
+    tripindices = instance._vertexindices[m:]
+    refuelindices = instance.ids(instance._refuelpoints)
+    
+    nodedata = dict((name, numpy.full(len(nodes), numpy.nan)) for name in TaskGraph.node_attributes)
+    nodedata['f0'][2:2+m] = [s.fuel for s in vehicles]
+    nodedata['ft'][2+m:] = instance.fuel_many(tripindices)
+    nodedata['ct'][2+m:] = instance.cost_many(tripindices)
+    nodedata['fmin'][2+m:] = numpy.min(instance.fuel_many(tripindices[:,None], refuelindices[None,:]), axis=1)
+    nodedata['fmax'][2+m:] = 1 - numpy.min(instance.fuel_many(refuelindices[:,None], tripindices[None,:]), axis=0)
+    
+    return nodes, nodedata
 
-    G.add_edges_from((s, de) for s in instance.vehicles)
-    G.add_edges_from((t, de) for t in instance.trips)
+def create_taskgraph(instance, horizon=None, processes=None, chunksize=None):
+    
+    nodes, nodedata = create_taskgraph_nodes(instance)
+    ds, de = nodes[:2]
+    m, n = len(instance.vehicles), len(instance.trips)
+    
+    arrays = taskgraph_arrays(instance)
+    processes = processes if processes else cpu_count()
+    chunksize = chunksize if chunksize else (m + n) / (16 * processes) + 1
+    chunks = [(lo, min(lo + chunksize, m + n), horizon) for lo in xrange(0, m + n, chunksize)]
+    
+    edges = util.map_blocks(taskgraph_block, arrays, chunks, processes)
+    
+    columns = [numpy.concatenate(column) for column in zip(*edges)] if edges else [numpy.empty(0, dtype=numpy.int64)] * (3 + len(TaskGraph.edge_attributes))
+    source = numpy.concatenate((numpy.zeros(m, dtype=numpy.int64), 2 + columns[0], numpy.arange(2, 2+m+n)))
+    target = numpy.concatenate((numpy.arange(2, 2+m), 2 + m + columns[1], numpy.ones(m + n, dtype=numpy.int64)))
+    padding = numpy.full(m, numpy.nan), numpy.full(m + n, numpy.nan)
+    edgedata = dict((name, numpy.concatenate((padding[0], column, padding[1]))) for name, column in itertools.izip(TaskGraph.edge_attributes, columns[3:]))
+    refuelpoint = numpy.concatenate((numpy.full(m, -1, dtype=numpy.int64), columns[2], numpy.full(m + n, -1, dtype=numpy.int64)))
+    
+    return TaskGraph.from_edges(nodes, nodedata, source, target, edgedata, refuelpoint, instance.refuelpoints, ds=ds, de=de, fuelpermeter=instance._fuelpermeter, refuelpersecond=instance._refuelpersecond)
 
-    return G
+def update_taskgraph(instance, G, horizon=None):
+    
+    if G.graph['fuelpermeter'] != instance._fuelpermeter or G.graph['refuelpersecond'] != instance._refuelpersecond or set(G.refuelpoints) != set(instance._refuelpoints):
+        return create_taskgraph(instance, horizon=horizon, processes=1)
+    
+    assert not any(isinstance(v, entities.Splitpoint) for v in G.nodes)
+    
+    nodes, nodedata = create_taskgraph_nodes(instance)
+    ds, de = nodes[:2]
+    m, n = len(instance.vehicles), len(instance.trips)
+    
+    index = G.index
+    position = numpy.fromiter((index.get(v, -1) for v in nodes), dtype=numpy.int64, count=len(nodes))
+    kept = position >= 0
+    mapping = numpy.full(G.number_of_nodes(), -1, dtype=numpy.int64)
+    mapping[position[kept]] = numpy.flatnonzero(kept)
+    
+    refuelindex = dict((r, i) for i, r in enumerate(instance.refuelpoints))
+    refuelmapping = numpy.array([refuelindex[r] for r in G.refuelpoints] + [-1], dtype=numpy.int64)
+    
+    edges = numpy.flatnonzero((mapping[G.sources] >= 0) & (mapping[G.indices] >= 0))
+    
+    added = numpy.flatnonzero(~kept[2:])
+    arrays = taskgraph_arrays(instance)
+    columns = [numpy.concatenate(column) for column in zip(
+        taskgraph_edges(arrays, added, horizon=horizon),
+        taskgraph_edges(arrays, numpy.flatnonzero(kept[2:]), added[added >= m] - m, horizon=horizon)
+    )]
+    
+    source = numpy.concatenate((mapping[G.sources[edges]], numpy.zeros(numpy.sum(added < m), dtype=numpy.int64), 2 + columns[0], 2 + added))
+    target = numpy.concatenate((mapping[G.indices[edges]], 2 + added[added < m], 2 + m + columns[1], numpy.ones(len(added), dtype=numpy.int64)))
+    padding = numpy.full(numpy.sum(added < m), numpy.nan), numpy.full(len(added), numpy.nan)
+    edgedata = dict((name, numpy.concatenate((G.edgedata[name][edges], padding[0], column, padding[1]))) for name, column in itertools.izip(TaskGraph.edge_attributes, columns[3:]))
+    refuelpoint = numpy.concatenate((refuelmapping[G.refuelpoint[edges]], numpy.full(len(padding[0]), -1, dtype=numpy.int64), columns[2], numpy.full(len(added), -1, dtype=numpy.int64)))
+    
+    return TaskGraph.from_edges(nodes, nodedata, source, target, edgedata, refuelpoint, instance.refuelpoints, ds=ds, de=de, fuelpermeter=instance._fuelpermeter, refuelpersecond=instance._refuelpersecond)
 
-def split_taskgraph_single(G, startpoints, endpoints, splittime, index):
-    splitpoints = []
-    for endpoint in endpoints:
-        splitpoint_id = 'Split%s_%d' % (endpoint, index + 1)
-        splitpoint = entities.Splitpoint(splitpoint_id = splitpoint_id, time = splittime)
-        splitpoints.append(splitpoint)
-        G.add_node(splitpoint, {
-            'ft': 0.0,
-            'ct': 0.0
-        })
-        attr = dict()
-        attr['refuelpoint'] = None
-        attr['fe'] = 0.0
-        attr['fg'] = 0.0
-        attr['fh'] = 0.0
-        attr['fd'] = 0.0
-        attr['fr'] = 0.0
-        attr['ce'] = 0.0
-        attr['cd'] = 0.0
-        G.add_edge(splitpoint, endpoint, attr)
-        for startpoint in startpoints:
-            attr =  G.get_edge_data(startpoint, endpoint, default = 0)
-            if attr:
-                G.add_edge(startpoint, splitpoint, attr)
-                G.remove_edge(startpoint, endpoint)
-    return G, splitpoints
+def sparsify_taskgraph(instance, G, maxidle=None, successors=None, maxcost=None):
+    
+    n = G.number_of_nodes()
+    trips = numpy.flatnonzero(numpy.fromiter((isinstance(v, entities.Trip) for v in G.nodes), dtype=bool, count=n))
+    trip = numpy.zeros(n, dtype=bool)
+    trip[trips] = True
+    
+    source = G.sources
+    target = G.indices
+    keep = numpy.ones(G.number_of_edges(), dtype=bool)
+    candidate = G.attributed & trip[source] & trip[target]
+    removed = OrderedDict()
+    
+    if maxidle is not None:
+        matrix = numpy.zeros(n, dtype=numpy.int64)
+        matrix[trips] = instance.ids(G.nodes[i] for i in trips)
+        start = numpy.zeros(n)
+        start[trips] = instance._start_time[matrix[trips]]
+        finish = numpy.zeros(n)
+        finish[trips] = instance._finish_time[matrix[trips]]
+        edges = numpy.flatnonzero(candidate)
+        idle = start[target[edges]] - finish[source[edges]] - numpy.trunc(instance.time_many(matrix[source[edges]], matrix[target[edges]]))
+        edges = edges[idle > maxidle.total_seconds()]
+        keep[edges] = False
+        removed['maxidle'] = len(edges)
+    
+    if maxcost is not None:
+        edges = numpy.flatnonzero(candidate & keep)
+        edges = edges[G.edgedata['ce'][edges] > maxcost]
+        keep[edges] = False
+        removed['maxcost'] = len(edges)
+    
+    if successors is not None:
+        edges = numpy.flatnonzero(candidate & keep)
+        edges = edges[numpy.lexsort((G.edgedata['ce'][edges], source[edges]))]
+        first = numpy.searchsorted(source[edges], source[edges])
+        edges = edges[numpy.arange(len(edges)) - first >= successors]
+        keep[edges] = False
+        removed['successors'] = len(edges)
+    
+    return TaskGraph.from_edges(G.nodes, G.nodedata, source[keep], target[keep], dict((name, column[keep]) for name, column in G.edgedata.iteritems()), G.refuelpoint[keep], G.refuelpoints, **G.graph), removed
 
-def split_taskgraph_customer(instance, graph, timepoints):
+def split_taskgraph_segments(G, trips, segment, timepoints):
     
-    graph_customer = networkx.DiGraph(data = graph)
+    n = G.number_of_nodes()
+    tripids = G.node_ids(trips)
+    nodesegment = numpy.zeros(n, dtype=numpy.int64)
+    nodesegment[tripids] = segment
+    position = numpy.zeros(n, dtype=numpy.int64)
+    position[tripids] = numpy.arange(len(trips))
     
     splitpoint_list = []
-    trip_list = []
-    customer_list = []
-    trips = list(instance.trips)
+    endpoint_list = []
+    offsets = [n]
+    for (index, timepoint) in enumerate(timepoints):
+        endpoints = numpy.flatnonzero(segment > index)
+        splitpoint_list.append([entities.Splitpoint(splitpoint_id = 'Split%s_%d' % (trips[t], index + 1), time = timepoint) for t in endpoints])
+        endpoint_list.append(endpoints)
+        offsets.append(offsets[-1] + len(endpoints))
+    
+    source = G.sources
+    target = G.indices.astype(numpy.int64)
+    crossing = numpy.flatnonzero(nodesegment[source] < nodesegment[target])
+    crossing = crossing[numpy.argsort(nodesegment[source[crossing]], kind='mergesort')]
+    bounds = numpy.searchsorted(nodesegment[source[crossing]], numpy.arange(len(timepoints) + 1))
+    for index in xrange(len(timepoints)):
+        edges = crossing[bounds[index]:bounds[index+1]]
+        target[edges] = offsets[index] + numpy.searchsorted(endpoint_list[index], position[target[edges]])
+    
+    k = offsets[-1] - n
+    source = numpy.concatenate((source, numpy.arange(n, n + k)))
+    target = numpy.concatenate([target] + [tripids[endpoints] for endpoints in endpoint_list])
+    nodedata = dict((name, numpy.concatenate((column, numpy.zeros(k) if name in ('ft', 'ct') else numpy.full(k, numpy.nan)))) for name, column in G.nodedata.iteritems())
+    edgedata = dict((name, numpy.concatenate((column, numpy.zeros(k)))) for name, column in G.edgedata.iteritems())
+    refuelpoint = numpy.concatenate((G.refuelpoint, numpy.full(k, -1, dtype=numpy.int32)))
+    splitpoints = [splitpoint for splitpoints in splitpoint_list for splitpoint in splitpoints]
+    
+    return TaskGraph.from_edges(G.nodes + splitpoints, nodedata, source, target, edgedata, refuelpoint, G.refuelpoints, **G.graph), splitpoint_list
 
+def split_taskgraph_customer(instance, graph, timepoints):
+    
+    trips = list(instance.trips)
+    starttime = instance._earliest[instance._customerpositions[instance._vertexindices[len(instance._vehicles):]]]
+    segment = numpy.zeros(len(trips), dtype=numpy.int64)
     for (index, timepoint) in enumerate(timepoints):
-        startpoints = list(instance.vehicles)
-        endpoints = []
-        partialtrips = []     
-        for trip in trips:
-            if instance.customer_starttime(trip) >= timepoint:
-                endpoints.append(trip)
-            else:
-                startpoints.append(trip)
-                partialtrips.append(trip)
-        trips = list(endpoints)
-        graph_customer, splitpoints = split_taskgraph_single(graph_customer, startpoints, endpoints, timepoint, index)
-        splitpoint_list.append(splitpoints)
-        trip_list.append(partialtrips)
-        customer_list.append(set(instance.customer(trip) for trip in partialtrips))
-        
-    trip_list.append(trips)
-    customer_list.append(set(instance.customer(trip) for trip in trip_list[-1]))
+        segment[(segment == index) & (starttime >= util.to_seconds(timepoint))] = index + 1
+    
+    graph_customer, splitpoint_list = split_taskgraph_segments(graph, trips, segment, timepoints)
+    
+    trip_list = [[trips[t] for t in numpy.flatnonzero(segment == index)] for index in xrange(len(timepoints) + 1)]
+    customer_list = [set(instance.customer(trip) for trip in partialtrips) for partialtrips in trip_list]
     splitpoint_list.append([])
     
     return graph_customer, splitpoint_list, trip_list, customer_list
 
 def split_taskgraph_time(instance, graph, timepoints):
     
-    graph_time = networkx.DiGraph(data = graph)
-    
-    splitpoint_list = []
-    trip_list = []
-    customer_list = []
-    route_list = []
     trips = list(instance.trips)
-    customers = set(instance._customers.keys())
-
+    starttime = instance._start_time[instance._vertexindices[len(instance._vehicles):]]
+    segment = numpy.zeros(len(trips), dtype=numpy.int64)
     for (index, timepoint) in enumerate(timepoints):
-        startpoints = list(instance.vehicles)
-        endpoints = []
-        partialtrips = []
-        partialcustomers = []
-        for trip in trips:
-            if trip.start_time >= timepoint:
-                endpoints.append(trip)
-            else:
-                startpoints.append(trip)
-                partialtrips.append(trip)
-        trips = list(endpoints)
-        graph_time, splitpoints = split_taskgraph_single(graph_time, startpoints, endpoints, timepoint, index)
-        splitpoint_list.append(splitpoints)
-        trip_list.append(partialtrips)
-        
-        for customer in customers:
-            if instance.latest_starttime(customer) < timepoint:
-                partialcustomers.append(customer)
-        customer_list.append(partialcustomers)
-        customers = customers - set(partialcustomers)
-        
-        partialroutes = set(instance.route(trip) for trip in partialtrips if not instance.customer(trip) in partialcustomers)
-        route_list.append(partialroutes)
-        
-    trip_list.append(trips)
+        segment[(segment == index) & (starttime >= util.to_seconds(timepoint))] = index + 1
+    
+    graph_time, splitpoint_list = split_taskgraph_segments(graph, trips, segment, timepoints)
+    
+    trip_list = [[trips[t] for t in numpy.flatnonzero(segment == index)] for index in xrange(len(timepoints) + 1)]
+    customers = instance.customers
+    customersegment = numpy.zeros(len(customers), dtype=numpy.int64)
+    for (index, timepoint) in enumerate(timepoints):
+        customersegment[(customersegment == index) & (instance._latest >= util.to_seconds(timepoint))] = index + 1
+    
+    customer_list = [[customers[c] for c in numpy.flatnonzero(customersegment == index)] for index in xrange(len(timepoints))]
+    customer_list.append(set(customers[c] for c in numpy.flatnonzero(customersegment == len(timepoints))))
+    route_list = []
+    for (index, partialcustomers) in enumerate(customer_list[:-1]):
+        partialcustomers = set(partialcustomers)
+        route_list.append(set(instance.route(trip) for trip in trip_list[index] if not instance.customer(trip) in partialcustomers))
     route_list.append([])
-    customer_list.append(customers)
     splitpoint_list.append([])
     
     return graph_time, splitpoint_list, trip_list, customer_list, route_list
 
+def subgraph_structure(G, startpoints, trips, endpoints):
+    
+    a, b, c = len(startpoints), len(trips), len(endpoints)
+    
+    sources = G.node_ids(startpoints + trips)
+    targetmap = dict((v, i) for i, v in enumerate(G.node_ids(trips + endpoints).tolist(), 2 + a))
+    lo, hi = G.indptr[sources], G.indptr[sources + 1]
+    lengths = hi - lo
+    edges = numpy.repeat(lo - numpy.cumsum(lengths) + lengths, lengths) + numpy.arange(numpy.sum(lengths))
+    source = numpy.repeat(numpy.arange(2, 2+a+b), lengths)
+    target = numpy.fromiter((targetmap.get(t, -1) for t in G.indices[edges].tolist()), dtype=numpy.int64, count=len(edges))
+    selected = (target >= 0) & ~numpy.isnan(G.edgedata['fe'][edges])
+    
+    source = numpy.concatenate((numpy.zeros(a, dtype=numpy.int64), source[selected], numpy.arange(2, 2+a+b+c)))
+    target = numpy.concatenate((numpy.arange(2, 2+a), target[selected], numpy.ones(a+b+c, dtype=numpy.int64)))
+    edges = numpy.concatenate((numpy.full(a, -1, dtype=numpy.int64), edges[selected], numpy.full(a+b+c, -1, dtype=numpy.int64)))
+    
+    order = numpy.lexsort((target, source))
+    indptr = numpy.zeros(2+a+b+c + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(source, minlength=2+a+b+c), out=indptr[1:])
+    
+    return startpoints, trips, endpoints, indptr, target[order], edges[order]
+
 def split_taskgraph_subproblem(instance, G, solution, customers):
     
     startpoints = set(instance.vehicles)
@@ -232,35 +523,32 @@ def split_taskgraph_subproblem(instance, G, solution, customers):
     
     ds = G.graph['ds']
     de = G.graph['de']
-
-    new_graph = networkx.DiGraph(ds=ds, de=de, fuelpermeter=instance._fuelpermeter, refuelpersecond=instance._refuelpersecond)
-
-    new_graph.add_node(ds)
-    new_graph.add_node(de)
     
-    new_graph.add_nodes_from((s, {
-        'f0': initial_fuel[s]
-    }) for s in startpoints)
-
-    new_graph.add_nodes_from((t, {
-        'ft': t.distance * instance._fuelpermeter,
-        'ct': t.distance * instance._costpermeter,
-    }) for t in trips)
-    
-    new_graph.add_nodes_from((s, {
-        'f0': initial_fuel[s],
-        'ft': 0.0,
-        'ct': 0.0
-    }) for s in endpoints)
-
-    new_graph.add_edges_from((ds, s) for s in startpoints)
-    
-    for (s, t) in itertools.product(itertools.chain(startpoints, trips), itertools.chain(trips, endpoints)):
-        attr = G.get_edge_data(s, t)
-        if attr:
-            new_graph.add_edge(s, t, attr)
-
-    new_graph.add_edges_from((s, de) for s in startpoints | trips | endpoints)
+    key = (frozenset(customers), frozenset(startpoints), frozenset(endpoints), frozenset(trips))
+    if key in G._subgraphs:
+        structure = G._subgraphs.pop(key)
+    else:
+        structure = subgraph_structure(G, list(startpoints), list(trips), list(endpoints))
+    G._subgraphs[key] = structure
+    if len(G._subgraphs) > TaskGraph.subgraph_cachesize:
+        G._subgraphs.popitem(last=False)
+    startpoints_list, trips_list, endpoints_list, indptr, indices, edges = structure
+    a, b = len(startpoints_list), len(trips_list)
+    nodes = [ds, de] + startpoints_list + trips_list + endpoints_list
+    
+    nodedata = dict((name, numpy.full(len(nodes), numpy.nan)) for name in TaskGraph.node_attributes)
+    nodedata['f0'][2:2+a] = [initial_fuel[s] for s in startpoints_list]
+    nodedata['ft'][2+a:2+a+b] = [t.distance * instance._fuelpermeter for t in trips_list]
+    nodedata['ct'][2+a:2+a+b] = [t.distance * instance._costpermeter for t in trips_list]
+    nodedata['f0'][2+a+b:] = [initial_fuel[s] for s in endpoints_list]
+    nodedata['ft'][2+a+b:] = 0.0
+    nodedata['ct'][2+a+b:] = 0.0
+    
+    attributed = edges >= 0
+    edgedata = dict((name, numpy.where(attributed, column[edges], numpy.nan)) for name, column in G.edgedata.iteritems())
+    refuelpoint = numpy.where(attributed, G.refuelpoint[edges], -1)
+    
+    new_graph = TaskGraph(nodes, nodedata, indptr, indices, edgedata, refuelpoint, G.refuelpoints, ds=ds, de=de, fuelpermeter=instance._fuelpermeter, refuelpersecond=instance._refuelpersecond)
     
     return new_graph, startpoints, endpoints, trips
 
@@ -269,23 +557,23 @@ def save_taskgraph_to_xpress(filename, instance, G, compress=None):
     data = OrderedDict([
         ('DS', G.graph['ds']),
         ('DE', G.graph['de']),
-        ('Vehicles', (xpress.xpress_index(s) for s in G.nodes_iter() if isinstance(s, entities.Vehicle))),
-        ('Trips', (xpress.xpress_index(t) for t in G.nodes_iter() if isinstance(t, entities.Trip))),
-        ('Splitpoints', (xpress.xpress_index(s) for s in G.nodes_iter() if isinstance(s, entities.Splitpoint))),
+        ('Vehicles', xpress_nodes(G, entities.Vehicle)),
+        ('Trips', xpress_nodes(G, entities.Trip)),
+        ('Splitpoints', xpress_nodes(G, entities.Splitpoint)),
         ('Refuelpoints', (xpress.xpress_index(r) for r in instance._refuelpoints)),
-        ('Trip_Refuelpoints', (((v, w), xpress.xpress_index(attr['refuelpoint']) if attr['refuelpoint'] else '') for v, w, attr in G.edges_iter(data=True) if 'refuelpoint' in attr)),
-        ('Nin', ((v, (xpress.xpress_index(w) for w in G.predecessors_iter(v))) for v in G.nodes())),
-        ('Nout', ((v, (xpress.xpress_index(w) for w in G.successors_iter(v))) for v in G.nodes())),
-        ('F0', ((v, attr['f0']) for v, attr in G.nodes_iter(data=True) if 'f0' in attr)),
-        ('FT', ((v, attr['ft']) for v, attr in G.nodes_iter(data=True) if 'ft' in attr)),
-        ('FE', (((v, w), attr['fe']) for v, w, attr in G.edges_iter(data=True) if 'fe' in attr)),
-        ('FG', (((v, w), attr['fg']) for v, w, attr in G.edges_iter(data=True) if 'fg' in attr)),
-        ('FH', (((v, w), attr['fh']) for v, w, attr in G.edges_iter(data=True) if 'fh' in attr)),
-        ('FD', (((v, w), attr['fd']) for v, w, attr in G.edges_iter(data=True) if 'fd' in attr)),
-        ('FR', (((v, w), attr['fr']) for v, w, attr in G.edges_iter(data=True) if 'fr' in attr)),
-        ('CT', ((v, attr['ct']) for v, attr in G.nodes_iter(data=True) if 'ct' in attr)),
-        ('CE', (((v, w), attr['ce']) for v, w, attr in G.edges_iter(data=True) if 'ce' in attr)),
-        ('CD', (((v, w), attr['cd']) for v, w, attr in G.edges_iter(data=True) if 'cd' in attr)),
+        ('Trip_Refuelpoints', xpress_edge_refuelpoints(G)),
+        ('Nin', xpress_adjacency(G, predecessors=True)),
+        ('Nout', xpress_adjacency(G)),
+        ('F0', xpress_node_values(G, 'f0')),
+        ('FT', xpress_node_values(G, 'ft')),
+        ('FE', xpress_edge_values(G, 'fe')),
+        ('FG', xpress_edge_values(G, 'fg')),
+        ('FH', xpress_edge_values(G, 'fh')),
+        ('FD', xpress_edge_values(G, 'fd')),
+        ('FR', xpress_edge_values(G, 'fr')),
+        ('CT', xpress_node_values(G, 'ct')),
+        ('CE', xpress_edge_values(G, 'ce')),
+        ('CD', xpress_edge_values(G, 'cd')),
         ('CR', ((r, cr) for (r, cr) in instance._routecost.iteritems())),
         ('Customers', (c for c in instance._customers.iterkeys())),
         ('Customer_Routes', ((c, r) for (c, r) in instance._customers.iteritems())),
@@ -293,12 +581,7 @@ def save_taskgraph_to_xpress(filename, instance, G, compress=None):
         ('Vehicle_Cost', instance._costpercar)
     ])
     
-    if compress is None:
-        compress = os.path.splitext(filename)[1] == '.gz'
-    if compress and not os.path.splitext(filename)[1] == '.gz':
-        filename += '.gz'
-    
-    with (gzip.open(filename, 'wb') if compress else open(filename, 'w')) as f:
+    with compression.open_file(filename, 'w', compress) as f:
         xpress.xpress_write(f, data)
 
 def save_split_taskgraph_to_xpress(filename, instance, G, splitpoint_list, trip_list, customer_list, route_list=[], compress=None):
@@ -313,34 +596,29 @@ def save_split_taskgraph_to_xpress(filename, instance, G, splitpoint_list, trip_
         ('Partial_Routes', (((i, (m for m in route_list[i-1])) for i in indices) if route_list else [])),
         ('DS', G.graph['ds']),
         ('DE', G.graph['de']),
-        ('Vehicles', (xpress.xpress_index(s) for s in G.nodes_iter() if isinstance(s, entities.Vehicle))),
-        ('Refuelpoints', (((v, w), xpress.xpress_index(attr['refuelpoint']) if attr['refuelpoint'] else '') for v, w, attr in G.edges_iter(data=True) if 'refuelpoint' in attr)),
-        ('Nin', ((v, (xpress.xpress_index(w) for w in G.predecessors_iter(v))) for v in G.nodes())),
-        ('Nout', ((v, (xpress.xpress_index(w) for w in G.successors_iter(v))) for v in G.nodes())),
-        ('F0', ((v, attr['f0']) for v, attr in G.nodes_iter(data=True) if 'f0' in attr)),
-        ('FT', ((v, attr['ft']) for v, attr in G.nodes_iter(data=True) if 'ft' in attr)),
-        ('FE', (((v, w), attr['fe']) for v, w, attr in G.edges_iter(data=True) if 'fe' in attr)),
-        ('FG', (((v, w), attr['fg']) for v, w, attr in G.edges_iter(data=True) if 'fg' in attr)),
-        ('FH', (((v, w), attr['fh']) for v, w, attr in G.edges_iter(data=True) if 'fh' in attr)),
-        ('FD', (((v, w), attr['fd']) for v, w, attr in G.edges_iter(data=True) if 'fd' in attr)),
-        ('FR', (((v, w), attr['fr']) for v, w, attr in G.edges_iter(data=True) if 'fr' in attr)),
-        ('CT', ((v, attr['ct']) for v, attr in G.nodes_iter(data=True) if 'ct' in attr)),
-        ('CE', (((v, w), attr['ce']) for v, w, attr in G.edges_iter(data=True) if 'ce' in attr)),
-        ('CD', (((v, w), attr['cd']) for v, w, attr in G.edges_iter(data=True) if 'cd' in attr)),
+        ('Vehicles', xpress_nodes(G, entities.Vehicle)),
+        ('Refuelpoints', xpress_edge_refuelpoints(G)),
+        ('Nin', xpress_adjacency(G, predecessors=True)),
+        ('Nout', xpress_adjacency(G)),
+        ('F0', xpress_node_values(G, 'f0')),
+        ('FT', xpress_node_values(G, 'ft')),
+        ('FE', xpress_edge_values(G, 'fe')),
+        ('FG', xpress_edge_values(G, 'fg')),
+        ('FH', xpress_edge_values(G, 'fh')),
+        ('FD', xpress_edge_values(G, 'fd')),
+        ('FR', xpress_edge_values(G, 'fr')),
+        ('CT', xpress_node_values(G, 'ct')),
+        ('CE', xpress_edge_values(G, 'ce')),
+        ('CD', xpress_edge_values(G, 'cd')),
         ('CR', ((r, cr) for (r, cr) in instance._routecost.iteritems())),
-        ('Fmin', ((v, attr['fmin']) for v, attr in G.nodes_iter(data=True) if 'fmin' in attr)),
-        ('Fmax', ((v, attr['fmax']) for v, attr in G.nodes_iter(data=True) if 'fmax' in attr)),
+        ('Fmin', xpress_node_values(G, 'fmin')),
+        ('Fmax', xpress_node_values(G, 'fmax')),
         ('Customer_Routes', ((c, r) for (c, r) in instance._customers.iteritems())),
         ('Routes', ((r, (xpress.xpress_index(t) for t in trips)) for r, trips in instance._routes.iteritems())),
         ('Vehicle_Cost', instance._costpercar)
     ])
     
-    if compress is None:
-        compress = os.path.splitext(filename)[1] == '.gz'
-    if compress and not os.path.splitext(filename)[1] == '.gz':
-        filename += '.gz'
-    
-    with (gzip.open(filename, 'wb') if compress else open(filename, 'w')) as f:
+    with compression.open_file(filename, 'w', compress) as f:
         xpress.xpress_write(f, data)
 
 def save_subproblem_taskgraph_to_xpress(filename, instance, G, startpoints, endpoints, trips, customers, compress=None):
@@ -356,19 +634,19 @@ def save_subproblem_taskgraph_to_xpress(filename, instance, G, startpoints, endp
         ('Trips', (xpress.xpress_index(t) for t in customer_trips)),
         ('Fixed_Trips', (xpress.xpress_index(t) for t in trips - customer_trips)),
         ('Endpoints', (xpress.xpress_index(t) for t in endpoints)),
-        ('Trip_Refuelpoints', (((v, w), xpress.xpress_index(attr['refuelpoint']) if attr['refuelpoint'] else '') for v, w, attr in G.edges_iter(data=True) if 'refuelpoint' in attr)),
-        ('Nin', ((v, (xpress.xpress_index(w) for w in G.predecessors_iter(v))) for v in G.nodes())),
-        ('Nout', ((v, (xpress.xpress_index(w) for w in G.successors_iter(v))) for v in G.nodes())),
-        ('F0', ((v, attr['f0']) for v, attr in G.nodes_iter(data=True) if 'f0' in attr)),
-        ('FT', ((v, attr['ft']) for v, attr in G.nodes_iter(data=True) if 'ft' in attr)),
-        ('FE', (((v, w), attr['fe']) for v, w, attr in G.edges_iter(data=True) if 'fe' in attr)),
-        ('FG', (((v, w), attr['fg']) for v, w, attr in G.edges_iter(data=True) if 'fg' in attr)),
-        ('FH', (((v, w), attr['fh']) for v, w, attr in G.edges_iter(data=True) if 'fh' in attr)),
-        ('FD', (((v, w), attr['fd']) for v, w, attr in G.edges_iter(data=True) if 'fd' in attr)),
-        ('FR', (((v, w), attr['fr']) for v, w, attr in G.edges_iter(data=True) if 'fr' in attr)),
-        ('CT', ((v, attr['ct']) for v, attr in G.nodes_iter(data=True) if 'ct' in attr)),
-        ('CE', (((v, w), attr['ce']) for v, w, attr in G.edges_iter(data=True) if 'ce' in attr)),
-        ('CD', (((v, w), attr['cd']) for v, w, attr in G.edges_iter(data=True) if 'cd' in attr)),
+        ('Trip_Refuelpoints', xpress_edge_refuelpoints(G)),
+        ('Nin', xpress_adjacency(G, predecessors=True)),
+        ('Nout', xpress_adjacency(G)),
+        ('F0', xpress_node_values(G, 'f0')),
+        ('FT', xpress_node_values(G, 'ft')),
+        ('FE', xpress_edge_values(G, 'fe')),
+        ('FG', xpress_edge_values(G, 'fg')),
+        ('FH', xpress_edge_values(G, 'fh')),
+        ('FD', xpress_edge_values(G, 'fd')),
+        ('FR', xpress_edge_values(G, 'fr')),
+        ('CT', xpress_node_values(G, 'ct')),
+        ('CE', xpress_edge_values(G, 'ce')),
+        ('CD', xpress_edge_values(G, 'cd')),
         ('CR', ((r, instance.route_cost(r)) for r in routes)),
         ('Customers', (c for c in customers)),
         ('Customer_Routes', ((c, instance._customers.get(c)) for c in customers)),
@@ -376,74 +654,98 @@ def save_subproblem_taskgraph_to_xpress(filename, instance, G, startpoints, endp
         ('Vehicle_Cost', instance._costpercar)
     ])
     
-    if compress is None:
-        compress = os.path.splitext(filename)[1] == '.gz'
-    if compress and not os.path.splitext(filename)[1] == '.gz':
-        filename += '.gz'
-    
-    with (gzip.open(filename, 'wb') if compress else open(filename, 'w')) as f:
+    with compression.open_file(filename, 'w', compress) as f:
         xpress.xpress_write(f, data)
 
 def save_taskgraph_to_json(G, filename, compress=None):
     dictionary = dict()
     dictionary['nodes'] = []
-    for node, attributes in G.nodes_iter(data = True):
+    labels = G.labels
+    for i, label in enumerate(labels):
         nodedict = dict()
-        nodedict['attributes'] = attributes
-        nodedict['successors'] = dict()
-        for successor in G.successors_iter(node):
-            edgeattributes = G.edge[node][successor]
+        nodedict['attributes'] = G.node_data(i)
+        nodedict['successors'] = dict((labels[G.indices[e]], G.edge_data(e)) for e in G.out_edges(i))
+        for edgeattributes in nodedict['successors'].itervalues():
             if ('refuelpoint' in edgeattributes) and edgeattributes['refuelpoint']:
                 edgeattributes['refuelpoint'] = xpress.xpress_index(edgeattributes['refuelpoint'])
-            nodedict['successors'][xpress.xpress_index(successor) if isinstance(successor, entities.Vehicle) or isinstance(successor, entities.Trip) or isinstance(successor, entities.Splitpoint) else successor] = edgeattributes
-        dictionary['nodes'].append({xpress.xpress_index(node) if isinstance(node, entities.Vehicle) or isinstance(node, entities.Trip) or isinstance(node, entities.Splitpoint) else node : nodedict})
+        dictionary['nodes'].append({label: nodedict})
     dictionary['attributes'] = G.graph
     
-    if compress is None:
-        compress = os.path.splitext(filename)[1] == '.gz'
-    if compress and not os.path.splitext(filename)[1] == '.gz':
-        filename += '.gz'
-    
-    with (gzip.open(filename, 'wb') if compress else open(filename, 'w')) as f:
+    with compression.open_file(filename, 'w', compress, parallel=True) as f:
         json.dump(dictionary,f)
 
 def load_taskgraph_from_json(filename, dictionary, compress=None):
     
-    if compress is None:
-        compress = os.path.splitext(filename)[1] == '.gz'
-    if compress and not os.path.splitext(filename)[1] == '.gz':
-        filename += '.gz'
-    
-    with (gzip.open(filename, 'rb') if compress else open(filename, 'r')) as f:
+    with compression.open_file(filename, 'r', compress) as f:
         data = json.load(f)
         
     ds = data['attributes']['ds']
     de = data['attributes']['de']
     fuelpermeter = data['attributes']['fuelpermeter']
     refuelpersecond = data['attributes']['refuelpersecond']
-    G = networkx.DiGraph(ds=ds, de=de, fuelpermeter=fuelpermeter, refuelpersecond=refuelpersecond)
-    for node in data['nodes']:
-        for key in node:
-            if key == ds or key == de:
-                    G.add_node(str(key))
-            else:
-                    G.add_node(dictionary[key], node[key]['attributes'])
+    
+    nodes = [str(key) if key == ds or key == de else dictionary[key] for node in data['nodes'] for key in node]
+    index = dict((key, i) for i, key in enumerate(key for node in data['nodes'] for key in node))
+    refuelpoints = []
+    refuelindex = {}
+    
+    nodedata = dict((name, numpy.full(len(nodes), numpy.nan)) for name in TaskGraph.node_attributes)
+    source, target, refuelpoint = [], [], []
+    edgedata = dict((name, []) for name in TaskGraph.edge_attributes)
+    
     for node in data['nodes']:
         for (key, value) in node.iteritems():
-            if key == ds or key == de:
-                for (name, attributes) in value['successors'].iteritems():
-                    if 'refuelpoint' in attributes:
-                        if attributes['refuelpoint']:
-                            attributes['refuelpoint'] = dictionary[attributes['refuelpoint']]
-                    G.add_edge(key, dictionary[name], attributes)
-            else:
-                for (name, attributes) in value['successors'].iteritems():
-                    if 'refuelpoint' in attributes:
-                        if attributes['refuelpoint']:
-                            attributes['refuelpoint'] = dictionary[attributes['refuelpoint']]
-                    G.add_edge(dictionary[key], de if name == de else dictionary[name], attributes)
-    for t in G.nodes_iter():
-        if isinstance(t, entities.Trip):
-            if all(G.edge[s][t]['fe'] > 1 and (G.edge[s][t]['fg'] > 1 or G.edge[s][t]['fh'] > 1) for s in G.predecessors_iter(t) if s != ds):
-                print "Warning: %s not reachable" % t
-    return G
\ No newline at end of file
+            for (name, attributes) in value['attributes'].iteritems():
+                nodedata[name][index[key]] = attributes
+            for (name, attributes) in value['successors'].iteritems():
+                source.append(index[key])
+                target.append(index[name])
+                for column in TaskGraph.edge_attributes:
+                    edgedata[column].append(attributes.get(column, numpy.nan))
+                if attributes.get('refuelpoint'):
+                    if not attributes['refuelpoint'] in refuelindex:
+                        refuelindex[attributes['refuelpoint']] = len(refuelpoints)
+                        refuelpoints.append(dictionary[attributes['refuelpoint']])
+                    refuelpoint.append(refuelindex[attributes['refuelpoint']])
+                else:
+                    refuelpoint.append(-1)
+    
+    G = TaskGraph.from_edges(nodes, nodedata, numpy.array(source, dtype=numpy.int64), numpy.array(target, dtype=numpy.int64), edgedata, refuelpoint, refuelpoints, ds=ds, de=de, fuelpermeter=fuelpermeter, refuelpersecond=refuelpersecond)
+    
+    edges = numpy.flatnonzero(G.attributed)
+    usable = ~((G.edgedata['fe'][edges] > 1) & ((G.edgedata['fg'][edges] > 1) | (G.edgedata['fh'][edges] > 1)))
+    reachable = numpy.zeros(G.number_of_nodes(), dtype=bool)
+    reachable[G.indices[edges[usable]]] = True
+    for t in numpy.flatnonzero(~reachable).tolist():
+        if isinstance(G.nodes[t], entities.Trip):
+            print "Warning: %s not reachable" % G.nodes[t]
+    return G
+
+
+def save_taskgraph_to_binary(G, filename):
+    
+    arrays = [('indptr', G.indptr), ('indices', G.indices), ('refuelpoint', G.refuelpoint)]
+    arrays.extend(('node_%s' % name, G.nodedata[name]) for name in TaskGraph.node_attributes)
+    arrays.extend(('edge_%s' % name, G.edgedata[name]) for name in TaskGraph.edge_attributes)
+    
+    util.save_binary(filename, 'TASKGRPH', arrays, {
+        'attributes': G.graph,
+        'nodes': G.labels,
+        'refuelpoints': [xpress.xpress_index(r) for r in G.refuelpoints]
+    })
+
+def load_taskgraph_from_binary(filename, dictionary):
+    
+    header, arrays = util.load_binary(filename, 'TASKGRPH', 'binary task graph')
+    
+    attributes = header['attributes']
+    ds = attributes['ds']
+    de = attributes['de']
+    nodes = [str(label) if label == ds or label == de else dictionary[label] for label in header['nodes']]
+    refuelpoints = [dictionary[label] for label in header['refuelpoints']]
+    
+    return TaskGraph(nodes,
+        dict((name, arrays['node_%s' % name]) for name in TaskGraph.node_attributes),
+        arrays['indptr'], arrays['indices'],
+        dict((name, arrays['edge_%s' % name]) for name in TaskGraph.edge_attributes),
+        arrays['refuelpoint'], refuelpoints, **dict((str(key), value) for key, value in attributes.iteritems()))
@@ -93,6 +93,20 @@ if __name__ == '__main__2':
     for i, j in enumerate(itertools.chain(set1, set2)):
         print i, j
 
+if __name__ == '__main__2':
+    instancefile = config['data']['base'] + r'TU_C50\instance.json.gz'
+    instance = storage.load_instance_from_json(instancefile)
+    reduced = instance.subinstance(refuelpoints=instance.refuelpoints[1:])
+    for old, new in ((reduced, instance), (instance, reduced)):
+        updated = taskgraph.update_taskgraph(new, taskgraph.create_taskgraph(old))
+        rebuilt = taskgraph.create_taskgraph(new)
+        assert updated.labels == rebuilt.labels and updated.refuelpoints == rebuilt.refuelpoints
+        assert (updated.indptr == rebuilt.indptr).all() and (updated.indices == rebuilt.indices).all() and (updated.refuelpoint == rebuilt.refuelpoint).all()
+        for name in taskgraph.TaskGraph.edge_attributes:
+            assert numpy.array_equal(numpy.isnan(updated.edgedata[name]), numpy.isnan(rebuilt.edgedata[name]))
+            assert numpy.allclose(updated.edgedata[name], rebuilt.edgedata[name], equal_nan=True)
+    print 'Finished'
+
 if __name__ == '__main__':
     times = [1443670100000, 1443673487000, 1443670183000, 1443673846000, 1443671059000, 1443674285000]
     time2 = [1443670100000, 1443673487000]
@@ -1,7 +1,19 @@
+from multiprocessing import Pool, cpu_count
 from itertools import izip_longest
 from datetime import datetime, timedelta
 from urlparse import urlunparse
 from urllib import urlencode
+import os
+import json
+import mmap
+import shutil
+import struct
+import tempfile
+
+import numpy
+import progressbar
+
+from config import config
 
 def grouper(iterable, n, fillvalue=None):
     "Collect data into fixed-length chunks or blocks"
@@ -28,6 +40,13 @@ def to_datetime(n):
     min_date = datetime(1970, 1, 1)
     return min_date + timedelta(milliseconds = n)
 
+def parse_times(strings):
+    return numpy.array(list(strings), dtype='datetime64[s]').astype(object).tolist()
+
+def to_seconds(time):
+    min_date = datetime(1970, 1, 1)
+    return (time - min_date).total_seconds()
+
 def accumulate(iterable):
     it = iter(iterable)
     total = next(it)
@@ -36,6 +55,108 @@ def accumulate(iterable):
         total = total + element
         yield total
 
+def gather(arrays, name, src, dst):
+    return arrays[name][arrays['rows'][src], arrays['cols'][dst]].astype(float)
+
+def npy_filename(array):
+    if not (isinstance(array, numpy.memmap) and isinstance(array.base, mmap.mmap) and array.filename and array.filename.endswith('.npy')):
+        return None
+    stored = numpy.load(array.filename, mmap_mode='r')
+    if stored.shape == array.shape and stored.dtype == array.dtype and stored.offset == array.offset and stored.flags.f_contiguous == array.flags.f_contiguous:
+        return array.filename
+    return None
+
+def shared_initializer(directory, scalars, links):
+    global shared
+    shared = dict(scalars)
+    for filename in os.listdir(directory):
+        shared[os.path.splitext(filename)[0]] = numpy.load(os.path.join(directory, filename), mmap_mode='r')
+    for name, filename in links.iteritems():
+        shared[name] = numpy.load(filename, mmap_mode='r')
+
+def shared_call(args):
+    function, chunk = args
+    return function(shared, *chunk)
+
+def map_blocks(function, arrays, chunks, processes=None):
+    "Apply function to the arrays and each chunk. Workers reopen arrays mapped from a .npy file, all other arrays are dumped once per call."
+    
+    if not chunks:
+        return []
+    
+    processes = processes if processes else cpu_count()
+    
+    progress = progressbar.ProgressBar(maxval=len(chunks), widgets=[progressbar.Bar('#', '[', ']'), ' ', progressbar.Percentage(), ' ', progressbar.Timer(), ' ', progressbar.ETA()], term_width=config['console']['width']).start()
+    
+    results = []
+    
+    if processes == 1:
+        for chunk in chunks:
+            results.append(function(arrays, *chunk))
+            progress.update(len(results))
+    else:
+        directory = tempfile.mkdtemp(prefix='shared')
+        try:
+            scalars = {}
+            links = {}
+            for name, value in arrays.iteritems():
+                if not isinstance(value, numpy.ndarray):
+                    scalars[name] = value
+                elif npy_filename(value):
+                    links[name] = npy_filename(value)
+                else:
+                    numpy.save(os.path.join(directory, name + '.npy'), value)
+            
+            pool = Pool(processes, shared_initializer, (directory, scalars, links))
+            try:
+                for result in pool.imap_unordered(shared_call, [(function, chunk) for chunk in chunks]):
+                    results.append(result)
+                    progress.update(len(results))
+            finally:
+                pool.terminate()
+                pool.join()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    
+    progress.finish()
+    
+    return results
+
+def save_binary(filename, magic, arrays, header={}):
+    
+    offset = 0
+    header = dict(header, arrays=[])
+    for name, array in arrays:
+        header['arrays'].append((name, array.dtype.str, array.shape, offset))
+        offset += -(-array.nbytes // 64) * 64
+    header = json.dumps(header)
+    
+    with open(filename, 'wb') as f:
+        f.write(magic)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        f.write('\0' * (-(16 + len(header)) % 64))
+        for name, array in arrays:
+            f.write(numpy.ascontiguousarray(array).tostring())
+            f.write('\0' * (-array.nbytes % 64))
+
+def load_binary(filename, magic, description):
+    
+    with open(filename, 'rb') as f:
+        if f.read(8) != magic:
+            raise ValueError('%s is no %s' % (filename, description))
+        length, = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(length))
+    
+    start = -(-(16 + length) // 64) * 64
+    data = numpy.memmap(filename, dtype=numpy.uint8, mode='r')
+    arrays = {}
+    for name, dtype, shape, offset in header.pop('arrays'):
+        dtype = numpy.dtype(str(dtype))
+        arrays[name] = data[start+offset:start+offset+dtype.itemsize*int(numpy.prod(shape))].view(dtype).reshape(shape)
+    
+    return header, arrays
+
 class Printer:
     
     verbose = True
@@ -1,6 +1,8 @@
 import itertools
 import re
 
+import numpy
+
 def xpress_index(obj, stringify=False):
     if isinstance(obj, int) or isinstance(obj, float) or isinstance(obj, bool):
         return repr(obj)
@@ -27,11 +29,7 @@ def xpress_data_string(ordereddict):
     return "\n".join(('%s: %s' % (name, xpress_value(value))) for name, value in ordereddict.iteritems())
 
 def xpress_write(f, ordereddict):
-    for name, value in ordereddict.iteritems():
-        f.write(name)
-        f.write(': ')
-        xpress_write_value(f, value)
-        f.write("\n")
+    xpress_writer(f).write(ordereddict)
 
 def xpress_write_value(f, obj):
     if isinstance(obj, int) or isinstance(obj, float) or isinstance(obj, bool):
@@ -90,6 +88,102 @@ def xpress_write_index(f, obj, stringify=False):
         else:
             f.write(obj.__xpress_index__())
             
+class xpress_writer(object):
+    numbers = frozenset([int, float, bool])
+    strings = frozenset([str, unicode])
+
+    def __init__(self, f, buffersize=1<<22, batchsize=1<<16):
+        self.f = f
+        self.buffersize = buffersize
+        self.batchsize = batchsize
+        self.buffer = []
+        self.size = 0
+
+    def write(self, ordereddict):
+        for name, value in ordereddict.iteritems():
+            self.append(name)
+            self.append(': ')
+            if isinstance(value, (set, list)):
+                value = iter(value)
+            elif isinstance(value, dict):
+                value = value.iteritems()
+            if hasattr(value, 'next'):
+                for chunk in self.format_items(value):
+                    self.append(chunk)
+            else:
+                self.append(self.format_value(value))
+            self.append('\n')
+        self.flush()
+
+    def append(self, data):
+        self.buffer.append(data)
+        self.size += len(data)
+        if self.size >= self.buffersize:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.f.write(''.join(self.buffer))
+            self.buffer = []
+            self.size = 0
+
+    def format_value(self, obj):
+        if isinstance(obj, int) or isinstance(obj, float) or isinstance(obj, bool):
+            return repr(obj)
+        elif isinstance(obj, str) or isinstance(obj, unicode):
+            return '"' + obj + '"'
+        elif isinstance(obj, set) or isinstance(obj, list):
+            return ''.join(self.format_items(iter(obj)))
+        elif isinstance(obj, dict):
+            return ''.join(self.format_items(obj.iteritems()))
+        elif hasattr(obj, 'next'):
+            return ''.join(self.format_items(obj))
+        else:
+            return repr(obj)
+
+    def format_items(self, obj):
+        first = next(obj, None)
+        if isinstance(first, tuple):
+            yield '['
+            batch = [first]
+            while batch:
+                yield ''.join(['\n\t(%s) %s' % (self.format_index(index, True), self.format_value(value)) for index, value in batch])
+                batch = list(itertools.islice(obj, self.batchsize))
+            yield '\n]'
+        elif first <> None:
+            yield '['
+            batch, separator = [first], ''
+            while batch:
+                yield separator + self.format_list(batch)
+                batch, separator = list(itertools.islice(obj, self.batchsize)), ' '
+            yield ']'
+        else:
+            yield '[]'
+
+    def format_list(self, items):
+        types = set(map(type, items))
+        if types <= self.numbers:
+            return ' '.join(map(repr, items))
+        elif types <= self.strings:
+            return '"' + '" "'.join(items) + '"'
+        else:
+            return ' '.join(map(self.format_value, items))
+
+    def format_index(self, obj, stringify=False):
+        if isinstance(obj, int) or isinstance(obj, float) or isinstance(obj, bool):
+            return repr(obj)
+        elif isinstance(obj, str) or isinstance(obj, unicode):
+            return '"' + obj + '"'
+        elif hasattr(obj, '__iter__'):
+            items = obj if isinstance(obj, tuple) else tuple(obj)
+            if items and set(map(type, items)) <= self.strings:
+                return '"' + '" "'.join(items) + '"'
+            return ' '.join(self.format_index(item, stringify=stringify) for item in items)
+        elif stringify:
+            return self.format_index(obj.__xpress_index__())
+        else:
+            return obj.__xpress_index__()
+
 class parser(object):
     re = None
 
@@ -113,6 +207,12 @@ class parser_real(parser):
 
     def cast(self, match):
         return float(match.group(0))
+
+    def read(self, tokens):
+        return float(tokens.expect('real'))
+
+    def read_many(self, tokens):
+        return [float(value) for value in tokens.take(('real',))]
             
 class parser_string(parser):
     re = re.compile(r'"([^\"\\]*(?:\\.[^\"\\]*)*)"|\'([^\'\\]*(?:\\.[^\'\\]*)*)\'|([A-Za-z_][A-Za-z0-9_]*)')
@@ -124,6 +224,12 @@ class parser_string(parser):
     def cast(self, match):
         return match.group(1) if match.group(1) != None else (match.group(2) if match.group(2) != None else match.group(3))
 
+    def read(self, tokens):
+        return tokens.expect('string', 'quoted', 'name')
+
+    def read_many(self, tokens):
+        return tokens.take(('string', 'quoted', 'name'))
+
 class parser_object(parser_string):
     dictionary = None
 
@@ -132,7 +238,15 @@ class parser_object(parser_string):
         self.dictionary.update(kwargs)
 
     def cast(self, match):
-        index = super(parser_object, self).cast(match)
+        return self.lookup(super(parser_object, self).cast(match))
+
+    def read(self, tokens):
+        return self.lookup(super(parser_object, self).read(tokens))
+
+    def read_many(self, tokens):
+        return [self.lookup(index) for index in super(parser_object, self).read_many(tokens)]
+
+    def lookup(self, index):
         if not index in self.dictionary:
             print 'Warning: %s could not be mapped to object.' % index
         return self.dictionary[index] if index in self.dictionary else index#
@@ -147,6 +261,12 @@ class parser_index(parser):
     def cast(self, match):
         return tuple(index.parse(group)[0] for index, group in itertools.izip(self.indices, match.groups()))
 
+    def read(self, tokens):
+        tokens.expect('lparen')
+        key = tuple(index.read(tokens) for index in self.indices)
+        tokens.expect('rparen')
+        return key
+
 class parser_pair(object):
     re_delimit = re.compile(r'\s*')
     key = None
@@ -169,6 +289,10 @@ class parser_pair(object):
         value, pos = self.value.parse(string, pos, progress)
         return (key, value), pos
 
+    def read(self, tokens):
+        key = self.key.read(tokens)
+        return key, self.value.read(tokens)
+
 class parser_collection(object):
     re_open = re.compile(r'\[\s*')
     re_delimit = re.compile(r'\s+|\s*,\s*')
@@ -209,6 +333,12 @@ class parser_collection(object):
         else:
             raise ValueError(pos)
 
+    def read(self, tokens):
+        tokens.expect('open')
+        while tokens.peek() != 'close':
+            yield self.value.read(tokens)
+        tokens.expect('close')
+
 class parser_list(parser_collection):
 
     def __init__(self, value):
@@ -217,6 +347,32 @@ class parser_list(parser_collection):
     def parse(self, string, pos=0, progress=None):
         return list(super(parser_list, self).parse(string, pos, progress)), self.end
 
+    def read(self, tokens):
+        if not hasattr(self.value, 'read_many'):
+            return list(super(parser_list, self).read(tokens))
+        tokens.expect('open')
+        items = self.value.read_many(tokens)
+        tokens.expect('close')
+        return items
+
+class parser_array(parser_list):
+
+    def __init__(self, value=None, dtype=float):
+        super(parser_array, self).__init__(value if value else parser_real())
+        self.dtype = dtype
+
+    def parse(self, string, pos=0, progress=None):
+        values, pos = super(parser_array, self).parse(string, pos, progress)
+        return numpy.array(values, dtype=self.dtype), pos
+
+    def read(self, tokens):
+        if not isinstance(self.value, parser_real):
+            return numpy.array(super(parser_array, self).read(tokens), dtype=self.dtype)
+        tokens.expect('open')
+        items = numpy.array(tokens.take(('real',)), dtype=float).astype(self.dtype)
+        tokens.expect('close')
+        return items
+
 class parser_dict(parser_collection):
 
     def __init__(self, index, value):
@@ -225,6 +381,9 @@ class parser_dict(parser_collection):
     def parse(self, string, pos=0, progress=None):
         return dict(((key[0] if len(key) == 1 else key), value) for key, value in super(parser_dict, self).parse(string, pos, progress)), self.end
 
+    def read(self, tokens):
+        return dict(((key[0] if len(key) == 1 else key), value) for key, value in super(parser_dict, self).read(tokens))
+
 
 class parser_tuple(object):
     re_open = re.compile(r'\[\s*')
@@ -269,6 +428,12 @@ class parser_tuple(object):
 
         return tuple(items), pos
 
+    def read(self, tokens):
+        tokens.expect('open')
+        items = tuple(value.read(tokens) for value in self.values)
+        tokens.expect('close')
+        return items
+
 class parser_definitions(object):
     re_open = re.compile(r'([A-Za-z_][A-Za-z_0-9]*):\s*')
     re_delimit = re.compile(r'\s+')
@@ -315,6 +480,98 @@ class parser_definitions(object):
             value = e.args[0]
             last = string.rfind('\n', 0, value)
             raise ValueError('Parsing error occured at {0}, {1}'.format(string.count('\n', 0, last + 1) + 1, value - last))
+
+    def read(self, f, chunksize=1<<20):
+
+        tokens = tokenizer(f, chunksize)
+        result = {}
+
+        while tokens.peek():
+            name = tokens.expect('name')
+            if not name in self.dictionary:
+                tokens.back()
+                raise tokens.error()
+            tokens.expect('colon')
+            result[name] = self.dictionary[name].read(tokens)
+
+        return result
+
+class tokenizer(object):
+    re_token = re.compile(r'\s*(?:(?P<open>\[)|(?P<close>\])|(?P<lparen>\()|(?P<rparen>\))|(?P<colon>:)|(?P<comma>,)|"(?P<string>[^\"\\]*(?:\\.[^\"\\]*)*)"|\'(?P<quoted>[^\'\\]*(?:\\.[^\'\\]*)*)\'|(?P<name>[A-Za-z_][A-Za-z0-9_]*)|(?P<real>(?:\+|-)?(?:\d*\.\d+|\d+\.?\d*)(?:e(?:\+|-)?\d+)?))')
+
+    def __init__(self, f, chunksize=1<<20):
+        self.f = f
+        self.chunksize = chunksize
+        self.lines = 0
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.matches = []
+        self.kinds = []
+        self.values = []
+        self.i = 0
+
+    def fill(self):
+        while self.i == len(self.kinds) and not self.eof:
+            chunk = self.f.read(self.chunksize)
+            self.eof = not chunk
+            self.lines += self.buffer.count('\n', 0, self.pos)
+            self.buffer, self.pos = self.buffer[self.pos:] + chunk, 0
+            buffer = self.buffer
+            matches = list(iter(self.re_token.scanner(buffer).match, None))
+            rest = buffer[matches[-1].end() if matches else 0:].lstrip()
+            failure = rest and (self.eof or (len(rest) > 64 and not rest[0] in ('"', '\'')))
+            if not (self.eof or failure):
+                while matches and matches[-1].end() + 64 >= len(buffer):
+                    matches.pop()
+            if matches:
+                self.pos = matches[-1].end()
+            self.matches = [match for match in matches if match.lastgroup != 'comma']
+            self.kinds = [match.lastgroup for match in self.matches]
+            self.values = [match.group(match.lastindex) for match in self.matches]
+            self.i = 0
+            if failure:
+                self.failure = len(buffer) - len(rest)
+                self.matches.append(None)
+                self.kinds.append('error')
+                self.values.append(None)
+                self.eof = True
+        return self.i < len(self.kinds)
+
+    def peek(self):
+        if self.i == len(self.kinds) and not self.fill():
+            return None
+        return self.kinds[self.i]
+
+    def back(self):
+        self.i -= 1
+
+    def expect(self, *kinds):
+        if not self.peek() in kinds:
+            raise self.error()
+        self.i += 1
+        return self.values[self.i - 1]
+
+    def take(self, kinds):
+        values = []
+        while self.peek() in kinds:
+            i = j = self.i
+            n, accepted = len(self.kinds), self.kinds
+            while j < n and accepted[j] in kinds:
+                j += 1
+            values.extend(self.values[i:j])
+            self.i = j
+        return values
+
+    def error(self):
+        if self.i < len(self.matches):
+            match = self.matches[self.i]
+            start = match.start(match.lastindex) if match else self.failure
+        else:
+            start = len(self.buffer)
+        buffer = self.buffer
+        last = buffer.rfind('\n', 0, start)
+        return ValueError('Parsing error occured at {0}, {1}'.format(self.lines + buffer.count('\n', 0, last + 1) + 1, start - last))
         
 def write(f, ordereddict):
     for name, value in ordereddict.iteritems():